@@ -1,3 +1,15 @@
 from django.contrib import admin
+from .models import Recommendation
 
-# Register your models here.
+
+@admin.register(Recommendation)
+class RecommendationAdmin(admin.ModelAdmin):
+    list_display = (
+        "crop",
+        "land_area",
+        "season",
+        "soil_quality",
+        "hits",
+        "last_used_at",
+    )
+    search_fields = ("crop",)
@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import re
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
+from .models import Recommendation
+
+logger = logging.getLogger(__name__)
+
+SEASONS = {
+    "spring": "spring",
+    "summer": "summer",
+    "autumn": "autumn",
+    "fall": "autumn",
+    "winter": "winter",
+}
+
+SOIL_QUALITIES = {
+    "poor": "poor",
+    "bad": "poor",
+    "low": "poor",
+    "average": "average",
+    "medium": "average",
+    "moderate": "average",
+    "fair": "average",
+    "good": "good",
+    "excellent": "excellent",
+}
+
+# Land area units in hectares; a bare number is in hectares, as entered in
+# the recommendation form.
+AREA_UNITS = {
+    "": Decimal(1),
+    "ha": Decimal(1),
+    "hectare": Decimal(1),
+    "hectares": Decimal(1),
+    "acre": Decimal("0.40468564224"),
+    "acres": Decimal("0.40468564224"),
+    "m2": Decimal("0.0001"),
+    "sqm": Decimal("0.0001"),
+    "sq m": Decimal("0.0001"),
+    "square meters": Decimal("0.0001"),
+    "square metres": Decimal("0.0001"),
+}
+
+# Land area recorded for cached per-square-metre rates.
+RATES_AREA = "per m2"
+
+# Kinds of cached response. The kind is part of the key, so rates and a
+# plan for the same inputs never share an entry.
+PLAN = "plan"
+RATES = "rates"
+
+AREA_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)\s*(.*)$")
+
+
+def fold(value):
+    return " ".join(str(value).casefold().split())
+
+
+def canonical_choice(value, choices):
+    value = fold(value).removesuffix(" season").removesuffix(" soil")
+    return choices.get(value, value)
+
+
+def parse_area(value):
+    """
+    Land area in hectares as a Decimal, or None if it does not parse.
+    """
+    match = AREA_PATTERN.match(fold(value).replace(",", ""))
+    if not match or match.group(2).strip(" .") not in AREA_UNITS:
+        return None
+    return Decimal(match.group(1)) * AREA_UNITS[match.group(2).strip(" .")]
+
+
+def canonical_area(value):
+    """
+    Land area in hectares as a plain decimal string, so "2.50", "2.5 ha"
+    and "25,000 m2" share an entry. Values that do not parse are only
+    case-folded.
+    """
+    hectares = parse_area(value)
+    if hectares is None:
+        return fold(value)
+    hectares = hectares.quantize(Decimal("0.0001")).normalize()
+    return f"{hectares:f}"
+
+
+def normalize_inputs(cropType, landArea, season, soilQuality):
+    return {
+        "crop": fold(cropType),
+        "land_area": canonical_area(landArea),
+        "season": canonical_choice(season, SEASONS),
+        "soil_quality": canonical_choice(soilQuality, SOIL_QUALITIES),
+    }
+
+
+def normalize_rate_inputs(cropType, season, soilQuality):
+    """
+    Inputs for per-square-metre rates, which do not depend on land area.
+    """
+    return normalize_inputs(cropType, RATES_AREA, season, soilQuality)
+
+
+def cache_key(inputs, kind=PLAN):
+    text = "\n".join(
+        [kind]
+        + [inputs[field] for field in ("crop", "land_area", "season", "soil_quality")]
+    )
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class RecommendationCache:
+    """
+    Database cache of farming plans keyed on normalized inputs. Entries
+    expire ``ttl`` seconds after they were generated, and the least recently
+    used are evicted beyond ``max_entries``. Hit, miss and bypass counts are
+    kept per process.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.counts = {"hit": 0, "miss": 0, "bypass": 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def count(self, result):
+        with self.lock:
+            self.counts[result] += 1
+
+    def expired_before(self):
+        return timezone.now() - timedelta(seconds=self.ttl)
+
+    def get(self, key, record=True):
+        """
+        Cached response for ``key``. ``record=False`` leaves the counters and
+        recency alone, for polling. Recording a hit is best-effort: if the
+        update fails, the cached response is still returned.
+        """
+        entry = (
+            Recommendation.objects.filter(
+                key=key, created_at__gte=self.expired_before()
+            )
+            .only("id", "response")
+            .first()
+        )
+        if not record:
+            return entry.response if entry else None
+        if entry is None:
+            self.count("miss")
+            return None
+        self.count("hit")
+        try:
+            Recommendation.objects.filter(id=entry.id).update(
+                hits=F("hits") + 1, last_used_at=timezone.now()
+            )
+        except DatabaseError as e:
+            logger.warning("Could not record recommendation hit: %s", str(e))
+        return entry.response
+
+    def set(self, key, inputs, response):
+        """
+        Stores ``response``. Failing to store it, e.g. when SQLite is
+        locked by concurrent writers, only loses the cache entry.
+        """
+        now = timezone.now()
+        try:
+            Recommendation.objects.update_or_create(
+                key=key,
+                defaults={
+                    **inputs,
+                    "response": response,
+                    "hits": 0,
+                    "created_at": now,
+                    "last_used_at": now,
+                },
+            )
+            self.evict()
+        except DatabaseError as e:
+            logger.warning("Could not cache recommendation: %s", str(e))
+
+    def evict(self):
+        Recommendation.objects.filter(created_at__lt=self.expired_before()).delete()
+        stale = Recommendation.objects.order_by("-last_used_at").values_list(
+            "id", flat=True
+        )[self.max_entries :]
+        if stale:
+            Recommendation.objects.filter(id__in=list(stale)).delete()
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        lookups = counts["hit"] + counts["miss"]
+        return {
+            **counts,
+            "hit_rate": counts["hit"] / lookups if lookups else 0.0,
+            "entries": Recommendation.objects.count(),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
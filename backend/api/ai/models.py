@@ -1,3 +1,20 @@
 from django.db import models
 
-# Create your models here.
+
+class Recommendation(models.Model):
+    """
+    Cached farming plan for one set of normalized assistant inputs.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    crop = models.CharField(max_length=255)
+    land_area = models.CharField(max_length=64)
+    season = models.CharField(max_length=32)
+    soil_quality = models.CharField(max_length=32)
+    response = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.crop}, {self.land_area}, {self.season}, {self.soil_quality}"
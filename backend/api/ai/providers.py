@@ -0,0 +1,318 @@
+import abc
+import asyncio
+import collections
+import enum
+import json
+import logging
+import random
+import threading
+import time
+import types as pytypes
+import typing
+import httpx
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from google import genai
+from google.genai import _api_client, types
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# SDK releases whose private async httpx client is swapped for a pooled
+# one; requirements.txt pins google-genai to one of these. Others keep the
+# SDK's default client.
+POOLED_SDK_VERSIONS = ("1.8.0", "1.9.0")
+
+
+class LLMProvider(abc.ABC):
+    """
+    What the assistant needs from an LLM backend: async one-shot
+    generation. Responses are ``GenerateContentResponse`` objects whatever
+    the backend, so callers only read ``.text``.
+    """
+
+    @abc.abstractmethod
+    async def agenerate_content(self, *, model, contents, config=None):
+        pass
+
+    def snapshot(self):
+        """
+        Call and connection counters for this process.
+        """
+        return {}
+
+
+class CallStats:
+    """
+    Per-process counters for provider calls: outcomes, latency and how many
+    HTTP connections and TLS handshakes they needed.
+    """
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.connections = 0
+        self.handshakes = 0
+
+    def record(self, outcome, seconds):
+        with self.lock:
+            self.calls[outcome] += 1
+            self.latencies.append(seconds)
+
+    def trace(self, event, info):
+        with self.lock:
+            if event == "connection.connect_tcp.complete":
+                self.connections += 1
+            elif event == "connection.start_tls.complete":
+                self.handshakes += 1
+
+    async def atrace(self, event, info):
+        self.trace(event, info)
+
+    async def aon_request(self, request):
+        with self.lock:
+            self.requests += 1
+        request.extensions["trace"] = self.atrace
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                "calls": dict(self.calls),
+                "requests": self.requests,
+                "connections_opened": self.connections,
+                "tls_handshakes": self.handshakes,
+            }
+        for name, quantile in (("p50", 0.5), ("p95", 0.95)):
+            stats[f"latency_{name}"] = (
+                latencies[int(quantile * (len(latencies) - 1))] if latencies else None
+            )
+        return stats
+
+
+class GeminiProvider(LLMProvider):
+    """
+    One client per event loop, since the SDK's async transport can only be
+    used from the loop that created it (each request under WSGI, one loop
+    per worker under ASGI). Each HTTP request, connecting included, is
+    bounded by ``timeout`` seconds and a whole call by ``deadline``. On
+    SDK versions in POOLED_SDK_VERSIONS, calls also reuse up to
+    ``pool_size`` kept-alive connections instead of opening a TLS
+    connection each.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        pool_size=20,
+        timeout=30.0,
+        deadline=60.0,
+        keepalive_expiry=60.0,
+    ):
+        self.api_key = api_key
+        # HttpOptions.timeout is in milliseconds.
+        self.http_options = types.HttpOptions(
+            timeout=int(min(timeout, deadline) * 1000)
+        )
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.deadline = deadline
+        self.stats = CallStats()
+        self.clients = {}
+        self.clients_lock = threading.Lock()
+
+        # The SDK has no option for connection limits in these versions, so
+        # each client gets one with them swapped in.
+        self.pooled = genai.__version__ in POOLED_SDK_VERSIONS
+        if not self.pooled:
+            logger.warning(
+                "Keeping the default Gemini HTTP client on google-genai %s.",
+                genai.__version__,
+            )
+
+    def create_client(self):
+        client = genai.Client(api_key=self.api_key, http_options=self.http_options)
+        if self.pooled:
+            client._api_client._async_httpx_client = _api_client.AsyncHttpxClient(
+                limits=self.limits,
+                event_hooks={"request": [self.stats.aon_request]},
+            )
+        return client
+
+    async def get_client(self):
+        """
+        The client for the running event loop, created on first use and
+        closed on that loop when it shuts down. Clients of loops closed
+        some other way are dropped.
+        """
+        loop = asyncio.get_running_loop()
+        with self.clients_lock:
+            if loop in self.clients:
+                return self.clients[loop][0]
+            for other in [l for l in self.clients if l.is_closed()]:
+                del self.clients[other]
+            client = self.create_client()
+            closer = self.close_on_shutdown(client)
+            self.clients[loop] = (client, closer)
+        await anext(closer)
+        return client
+
+    async def close_on_shutdown(self, client):
+        # Parked at the yield until the loop finalizes its async generators,
+        # which asyncio.run (and so async_to_sync under WSGI) does before
+        # closing it.
+        try:
+            yield
+        finally:
+            if self.pooled:
+                await client._api_client._async_httpx_client.aclose()
+
+    async def agenerate_content(self, *, model, contents, config=None):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            client = await self.get_client()
+            response = await asyncio.wait_for(
+                client.aio.models.generate_content(
+                    model=model, contents=contents, config=config
+                ),
+                self.deadline,
+            )
+            outcome = "ok"
+            return response
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            outcome = "timeout"
+            raise
+        finally:
+            self.stats.record(outcome, time.perf_counter() - start)
+
+    def snapshot(self):
+        stats = self.stats.snapshot()
+        with self.clients_lock:
+            clients = [client for client, _ in self.clients.values()]
+        stats["connections_open"] = (
+            sum(
+                len(c._api_client._async_httpx_client._transport._pool.connections)
+                for c in clients
+            )
+            if self.pooled
+            else None
+        )
+        return stats
+
+
+class StubProviderError(Exception):
+    pass
+
+
+def canned_value(annotation, name):
+    """
+    Fixed value of type ``annotation`` for the field ``name``.
+    """
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Literal:
+        return args[0]
+    if origin in (typing.Union, pytypes.UnionType):
+        return canned_value(next(arg for arg in args if arg is not type(None)), name)
+    if origin is list:
+        return [canned_value(args[0], f"{name} {index}") for index in (1, 2)]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return canned_output(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return list(annotation)[0].value
+    if annotation is bool:
+        return True
+    if annotation is int:
+        return 90
+    if annotation is float:
+        return 0.9
+    return f"Stub {name}."
+
+
+def canned_output(schema):
+    """
+    Schema-valid instance of the pydantic ``schema`` as a dict.
+    """
+    value = {
+        name: canned_value(field.annotation, name)
+        for name, field in schema.model_fields.items()
+    }
+    return schema.model_validate(value).model_dump(mode="json")
+
+
+class StubProvider(LLMProvider):
+    """
+    Offline provider for load tests and benchmarks. Answers with canned
+    output that is valid for the request's ``response_schema`` after
+    ``latency_ms`` and fails ``failure_rate`` of calls with
+    StubProviderError. Failures follow ``seed`` so runs are repeatable.
+    """
+
+    def __init__(self, latency_ms=200, failure_rate=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def reply_text(self, config):
+        with self.lock:
+            failed = self.random.random() < self.failure_rate
+        if failed:
+            raise StubProviderError("Stub provider failure.")
+
+        schema = getattr(config, "response_schema", None)
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            return json.dumps(canned_output(schema))
+        return "Stub response."
+
+    def response(self, text):
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    content=types.ModelContent(parts=[types.Part.from_text(text=text)]),
+                    finish_reason=types.FinishReason.STOP,
+                )
+            ]
+        )
+
+    async def agenerate_content(self, *, model, contents, config=None):
+        await asyncio.sleep(self.latency)
+        return self.response(self.reply_text(config))
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    Provider selected by LLM_PROVIDER: "gemini", or "stub" to run without
+    the Gemini API.
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            if settings.LLM_PROVIDER not in ("gemini", "stub"):
+                raise ImproperlyConfigured(
+                    f"LLM_PROVIDER must be gemini or stub, got {settings.LLM_PROVIDER!r}."
+                )
+            if settings.LLM_PROVIDER == "stub":
+                _provider = StubProvider(
+                    latency_ms=settings.LLM_STUB_LATENCY_MS,
+                    failure_rate=settings.LLM_STUB_FAILURE_RATE,
+                    seed=settings.LLM_STUB_SEED,
+                )
+            else:
+                _provider = GeminiProvider(
+                    settings.GEMINI_API_KEY,
+                    pool_size=settings.GEMINI_POOL_SIZE,
+                    timeout=settings.GEMINI_TIMEOUT,
+                    deadline=settings.GEMINI_DEADLINE,
+                )
+    return _provider
@@ -0,0 +1,91 @@
+from decimal import Decimal
+from google.genai import types
+from pydantic import BaseModel
+from typing import List, Literal
+
+
+class RateResource(BaseModel):
+    name: str
+    kg_per_square_metre: float
+    category: Literal["Seeds", "Fertilizers", "Herbicides", "Insecticides", "Other"]
+
+
+class RatesResponse(BaseModel):
+    title: str
+    crop: str
+    soilquality: str
+    season: str
+    description: str
+    insights: List[str]
+    resources: List[RateResource]
+    tools: List[str]
+    water_litres_per_square_metre: float
+    water_period: str
+    recommendations: List[str]
+    confidence: int
+
+
+RATES_INSTRUCTION = "Act as a knowledgeable farming assistant helping a farmer plan crop cultivation efficiently. You will receive inputs including the crop type, soil quality, and the planting season (summer, spring, autumn, or winter). Based on these factors, provide a detailed list of required resources with the quantity of each in kilograms per square meter of land, and the water needed in liters per square meter with the period it is needed over, such as per week. Additionally, specify the necessary tools essential for planting and maintaining the crop. Do not assume a land area. Ensure the output is clear, structured, and directly actionable for the farmer."
+
+RATES_CONFIG = types.GenerateContentConfig(
+    temperature=0.1,
+    top_k=1,
+    top_p=1,
+    max_output_tokens=2048,
+    system_instruction=RATES_INSTRUCTION,
+    response_mime_type="application/json",
+    response_schema=RatesResponse,
+)
+
+
+def rates_message(cropType, season, soilQuality):
+    return f"Croptype : {cropType}, Soil Quality : {soilQuality}, Season : {season}"
+
+
+def format_amount(value, unit):
+    """
+    ``value`` rounded to three significant figures for small amounts and
+    whole units for large ones, e.g. "0.125 kg" or "1,250 kg".
+    """
+    if value >= 100:
+        return f"{value:,.0f} {unit}"
+    return f"{float(f'{value:.3g}'):g} {unit}"
+
+
+def scale_rates(rates, landArea, hectares):
+    """
+    FarmingResponse dict for ``hectares`` of land from per-square-metre
+    ``rates``. Raises ValueError if ``rates`` does not match RatesResponse.
+    """
+    rates = RatesResponse.model_validate(rates).model_dump(mode="json")
+    square_metres = float(hectares * Decimal(10000))
+    return {
+        "title": rates["title"],
+        "crop": rates["crop"],
+        "landarea": str(landArea),
+        "soilquality": rates["soilquality"],
+        "season": rates["season"],
+        "description": rates["description"],
+        "insights": rates["insights"],
+        "resources": [
+            {
+                "name": resource["name"],
+                "quantity": format_amount(
+                    resource["kg_per_square_metre"] * square_metres, "kg"
+                ),
+                "category": resource["category"],
+            }
+            for resource in rates["resources"]
+        ],
+        "tools": rates["tools"],
+        "water_requirement": " ".join(
+            [
+                format_amount(
+                    rates["water_litres_per_square_metre"] * square_metres, "liters"
+                ),
+                rates["water_period"],
+            ]
+        ),
+        "recommendations": rates["recommendations"],
+        "confidence": rates["confidence"],
+    }
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs
+    the call and callers arriving while it runs share its result. Works
+    across the threads, and event loops, of one process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.counts = {"leader": 0, "coalesced": 0}
+
+    def join(self, key):
+        """
+        Returns the call's future and whether this caller has to run it.
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                self.counts["coalesced"] += 1
+                return future, False
+            future = self.calls[key] = Future()
+            self.counts["leader"] += 1
+            return future, True
+
+    def finish(self, key, future, result=None, error=None):
+        with self.lock:
+            del self.calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def do(self, key, fn):
+        """
+        Awaits ``fn()``, or the call already running for ``key``. The call
+        runs in its own task, so a caller that is cancelled, e.g. by a
+        client disconnect, leaves it running for the others.
+        """
+        future, leader = self.join(key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda task: self.settle(key, future, task))
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def settle(self, key, future, task):
+        if task.cancelled():
+            self.finish(key, future, error=RuntimeError("Call was cancelled."))
+        elif task.exception() is not None:
+            self.finish(key, future, error=task.exception())
+        else:
+            self.finish(key, future, task.result())
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, "in_flight": len(self.calls)}
+
+
+class SharedFlight:
+    """
+    Marks keys being generated in a Django cache shared by all workers, so
+    other processes wait for the result to appear in the recommendation
+    cache instead of generating it again. A claim expires after
+    ``timeout`` seconds in case its process dies; waiters check every
+    ``poll`` seconds.
+    """
+
+    def __init__(self, cache, timeout, poll):
+        self.cache = cache
+        self.timeout = timeout
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.counts = {"claimed": 0, "waited": 0}
+
+    def marker(self, key):
+        return f"ai:flight:{key}"
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    async def claim(self, key):
+        claimed = await self.cache.aadd(self.marker(key), 1, self.timeout)
+        if claimed:
+            self.count("claimed")
+        return claimed
+
+    async def release(self, key):
+        await self.cache.adelete(self.marker(key))
+
+    async def wait(self, key, lookup):
+        """
+        Polls ``lookup()`` until it returns a result, or None once the claim
+        is gone without one.
+        """
+        self.count("waited")
+        while True:
+            result = await lookup()
+            if result is not None or await self.cache.aget(self.marker(key)) is None:
+                return result
+            await asyncio.sleep(self.poll)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
@@ -1,3 +1,354 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import caches
+from django.db import OperationalError
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from google import genai
+from google.genai import _api_client
 
-# Create your tests here.
+from . import views
+from .cache import (
+    RATES,
+    RecommendationCache,
+    cache_key,
+    normalize_inputs,
+    normalize_rate_inputs,
+    parse_area,
+)
+from .models import Recommendation
+from .providers import GeminiProvider, StubProvider
+from .rates import RATES_CONFIG, format_amount, scale_rates
+from .singleflight import SharedFlight, SingleFlight
+
+
+class CacheKeyKindTests(TestCase):
+    def test_rates_and_plans_do_not_share_keys(self):
+        rates = normalize_rate_inputs("Wheat", "winter", "good")
+        plan = normalize_inputs("Wheat", "per m2", "winter", "good")
+        self.assertEqual(rates, plan)
+        self.assertNotEqual(cache_key(rates, RATES), cache_key(plan))
+
+    def test_plan_for_per_m2_area_misses_cached_rates(self):
+        cache = RecommendationCache(ttl=60, max_entries=10)
+        rates = normalize_rate_inputs("Wheat", "winter", "good")
+        cache.set(cache_key(rates, RATES), rates, {"rates": []})
+
+        plan = normalize_inputs("wheat", "per m2", "Winter", "Good")
+        self.assertIsNone(cache.get(cache_key(plan)))
+        self.assertEqual(cache.get(cache_key(rates, RATES)), {"rates": []})
+
+
+class NormalizeInputsTests(TestCase):
+    def test_equivalent_inputs_share_a_key(self):
+        keys = {
+            cache_key(normalize_inputs(*inputs))
+            for inputs in [
+                ("Wheat", "2.5", "Winter", "Good"),
+                (" wheat ", "2.50 ha", "winter season", "good soil"),
+                ("WHEAT", "25,000 m2", "winter", "GOOD"),
+            ]
+        }
+        self.assertEqual(len(keys), 1)
+
+    def test_synonyms_are_canonical(self):
+        inputs = normalize_inputs("Rice", "1 hectare", "Fall", "medium")
+        self.assertEqual(
+            inputs,
+            {
+                "crop": "rice",
+                "land_area": "1",
+                "season": "autumn",
+                "soil_quality": "average",
+            },
+        )
+
+    def test_unparsed_area_is_only_folded(self):
+        self.assertEqual(
+            normalize_inputs("rice", "Two  Fields", "", "")["land_area"], "two fields"
+        )
+
+
+class ParseAreaTests(TestCase):
+    def test_units(self):
+        self.assertEqual(parse_area("3"), Decimal(3))
+        self.assertEqual(parse_area("10000 sq m"), Decimal(1))
+        self.assertEqual(parse_area("1 acre"), Decimal("0.40468564224"))
+        self.assertEqual(parse_area("1,000 m2"), Decimal("0.1"))
+
+    def test_unknown_units_do_not_parse(self):
+        for value in ["", "per m2", "2 bighas", "-1 ha", "a lot"]:
+            with self.subTest(value=value):
+                self.assertIsNone(parse_area(value))
+
+
+class RecommendationCacheTests(TestCase):
+    def setUp(self):
+        self.cache = RecommendationCache(ttl=60, max_entries=2)
+        self.inputs = normalize_inputs("wheat", "1", "winter", "good")
+        self.key = cache_key(self.inputs)
+
+    def test_hit_and_miss_are_counted(self):
+        self.assertIsNone(self.cache.get(self.key))
+        self.cache.set(self.key, self.inputs, {"plan": 1})
+        self.assertEqual(self.cache.get(self.key), {"plan": 1})
+        self.assertEqual(Recommendation.objects.get(key=self.key).hits, 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hit"], stats["miss"], stats["entries"]), (1, 1, 1))
+
+    def test_expired_entries_miss(self):
+        self.cache.set(self.key, self.inputs, {"plan": 1})
+        Recommendation.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+        self.assertIsNone(self.cache.get(self.key))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for crop in ["wheat", "rice", "maize"]:
+            inputs = normalize_inputs(crop, "1", "winter", "good")
+            self.cache.set(cache_key(inputs), inputs, {"crop": crop})
+        self.assertEqual(
+            set(Recommendation.objects.values_list("crop", flat=True)),
+            {"rice", "maize"},
+        )
+
+    def test_failed_write_loses_only_the_entry(self):
+        with mock.patch.object(
+            Recommendation.objects, "update_or_create", side_effect=OperationalError
+        ), self.assertLogs("ai.cache", "WARNING"):
+            self.cache.set(self.key, self.inputs, {"plan": 1})
+        self.assertIsNone(self.cache.get(self.key))
+
+    def test_failed_hit_update_still_returns_the_entry(self):
+        self.cache.set(self.key, self.inputs, {"plan": 1})
+        with mock.patch.object(
+            QuerySet, "update", side_effect=OperationalError("database is locked")
+        ), self.assertLogs("ai.cache", "WARNING"):
+            self.assertEqual(self.cache.get(self.key), {"plan": 1})
+        self.assertEqual(self.cache.stats()["hit"], 1)
+
+
+class StreamPlansTests(TestCase):
+    async def collect(self, plots):
+        return [json.loads(line) async for line in views.stream_plans(plots, False)]
+
+    async def test_a_failing_group_does_not_fail_the_batch(self):
+        async def plan(cropType, *args, refresh):
+            if cropType == "rice":
+                raise ValueError("bad response")
+            return {"crop": cropType}
+
+        plots = [
+            {
+                "cropType": crop,
+                "landArea": "1",
+                "season": "winter",
+                "soilQuality": "good",
+            }
+            for crop in ["wheat", "rice", "Wheat"]
+        ]
+        with mock.patch.object(views, "get_ai_response", plan), self.assertLogs(
+            "ai.views", "ERROR"
+        ):
+            lines = await self.collect(plots)
+
+        by_index = {line.pop("index"): line for line in lines}
+        self.assertEqual(by_index[0], {"data": {"crop": "wheat"}})
+        self.assertEqual(by_index[2], by_index[0])
+        self.assertEqual(by_index[1], {"error": "Server Error: bad response"})
+
+
+class SingleFlightTests(TestCase):
+    async def test_concurrent_calls_share_one_run(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "plan"
+
+        results = await asyncio.gather(*(flight.do("key", fn) for _ in range(5)))
+        self.assertEqual(results, ["plan"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats(), {"leader": 1, "coalesced": 4, "in_flight": 0})
+
+    async def test_errors_reach_every_caller(self):
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        results = await asyncio.gather(
+            flight.do("key", fn), flight.do("key", fn), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    async def test_cancelled_caller_leaves_the_call_running(self):
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.02)
+            return "plan"
+
+        first = asyncio.ensure_future(flight.do("key", fn))
+        second = asyncio.ensure_future(flight.do("key", fn))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, "plan")
+
+
+class SharedFlightTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.flight = SharedFlight(caches["default"], timeout=5, poll=0.01)
+
+    async def test_only_one_claim_until_released(self):
+        self.assertTrue(await self.flight.claim("key"))
+        self.assertFalse(await self.flight.claim("key"))
+        await self.flight.release("key")
+        self.assertTrue(await self.flight.claim("key"))
+
+    async def test_wait_returns_the_result_or_none_once_released(self):
+        await self.flight.claim("key")
+        results = iter([None, "plan"])
+
+        async def lookup():
+            return next(results)
+
+        self.assertEqual(await self.flight.wait("key", lookup), "plan")
+
+        async def missing():
+            return None
+
+        await self.flight.release("key")
+        self.assertIsNone(await self.flight.wait("key", missing))
+        self.assertEqual(self.flight.stats(), {"claimed": 1, "waited": 2})
+
+
+class GeminiProviderTests(TestCase):
+    def test_timeout_goes_through_http_options(self):
+        provider = GeminiProvider("key", timeout=30.0, deadline=10.0)
+        client = provider.create_client()
+        self.assertEqual(client._api_client._http_options.timeout, 10000)
+
+    def test_each_event_loop_gets_its_own_client(self):
+        # As under WSGI, where every async view runs on a new loop.
+        provider = GeminiProvider("key")
+
+        async def clients():
+            return await provider.get_client(), await provider.get_client()
+
+        first, again = asyncio.run(clients())
+        second, _ = asyncio.run(clients())
+        self.assertIs(first, again)
+        self.assertIsNot(first, second)
+        # Closed on its own loop as that loop shut down.
+        self.assertTrue(first._api_client._async_httpx_client.is_closed)
+
+    def test_pool_is_swapped_in_on_known_sdk_versions(self):
+        with mock.patch.object(genai, "__version__", "1.9.0"):
+            provider = GeminiProvider("key", pool_size=3)
+        self.assertTrue(provider.pooled)
+        client = provider.create_client()
+        self.assertIsInstance(
+            client._api_client._async_httpx_client, _api_client.AsyncHttpxClient
+        )
+        self.assertEqual(provider.snapshot()["connections_open"], 0)
+
+    def test_other_sdk_versions_keep_the_default_client(self):
+        with mock.patch.object(genai, "__version__", "2.0.0"), self.assertLogs(
+            "ai.providers", "WARNING"
+        ):
+            provider = GeminiProvider("key", pool_size=3)
+        self.assertFalse(provider.pooled)
+        self.assertIsNone(provider.snapshot()["connections_open"])
+
+
+WHEAT_RATES = {
+    "title": "Wheat plan",
+    "crop": "wheat",
+    "soilquality": "good",
+    "season": "winter",
+    "description": "Winter wheat.",
+    "insights": ["Sow early."],
+    "resources": [
+        {"name": "Seed", "kg_per_square_metre": 0.0125, "category": "Seeds"},
+        {"name": "Urea", "kg_per_square_metre": 0.00002, "category": "Fertilizers"},
+    ],
+    "tools": ["Seed drill"],
+    "water_litres_per_square_metre": 5,
+    "water_period": "per week",
+    "recommendations": ["Irrigate at crown root stage."],
+    "confidence": 80,
+}
+
+
+class ScaleRatesTests(TestCase):
+    def test_rates_scale_to_the_land_area(self):
+        plan = scale_rates(WHEAT_RATES, "2 ha", Decimal(2))
+        self.assertEqual(plan["landarea"], "2 ha")
+        self.assertEqual(
+            [resource["quantity"] for resource in plan["resources"]],
+            ["250 kg", "0.4 kg"],
+        )
+        self.assertEqual(plan["water_requirement"], "100,000 liters per week")
+        views.FarmingResponse.model_validate(plan)
+
+    def test_format_amount(self):
+        self.assertEqual(format_amount(0.12345, "kg"), "0.123 kg")
+        self.assertEqual(format_amount(12.5, "kg"), "12.5 kg")
+        self.assertEqual(format_amount(1250.4, "kg"), "1,250 kg")
+
+    @override_settings(ASSISTANT_PER_UNIT_RATES=True)
+    async def test_one_rates_call_serves_every_area(self):
+        provider = StubProvider(latency_ms=0)
+        with mock.patch.object(
+            views, "get_provider", return_value=provider
+        ), mock.patch.object(
+            provider, "agenerate_content", wraps=provider.agenerate_content
+        ) as generate:
+            small = await views.get_ai_response("Wheat", "1 ha", "winter", "good")
+            large = await views.get_ai_response("wheat", "3 acres", "Winter", "Good")
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual((small["landarea"], large["landarea"]), ("1 ha", "3 acres"))
+        self.assertIs(generate.call_args.kwargs["config"], RATES_CONFIG)
+
+
+class MalformedReplyTests(TestCase):
+    def test_scale_rates_rejects_missing_or_non_numeric_fields(self):
+        for rates in [
+            {key: value for key, value in WHEAT_RATES.items() if key != "resources"},
+            {**WHEAT_RATES, "water_litres_per_square_metre": "a lot"},
+            {
+                **WHEAT_RATES,
+                "resources": [{"name": "Seed", "kg_per_square_metre": None}],
+            },
+        ]:
+            with self.subTest(rates=rates), self.assertRaises(ValueError):
+                scale_rates(rates, "1 ha", Decimal(1))
+
+    @override_settings(ASSISTANT_PER_UNIT_RATES=True)
+    async def test_malformed_reply_is_not_cached(self):
+        provider = StubProvider(latency_ms=0)
+        partial = provider.response(json.dumps({"title": "Wheat plan"}))
+        with mock.patch.object(
+            views, "get_provider", return_value=provider
+        ), mock.patch.object(
+            provider, "agenerate_content", return_value=partial
+        ), self.assertLogs(
+            "ai.views", "ERROR"
+        ):
+            self.assertIsNone(
+                await views.get_ai_response("wheat", "1 ha", "winter", "good")
+            )
+        self.assertFalse(await Recommendation.objects.aexists())
+
+        # The next request asks the model again and gets a valid reply.
+        with mock.patch.object(views, "get_provider", return_value=provider):
+            plan = await views.get_ai_response("wheat", "1 ha", "winter", "good")
+        self.assertEqual(plan["landarea"], "1 ha")
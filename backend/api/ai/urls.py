@@ -1,6 +1,14 @@
 from django.urls import path
-from .views import assistant_view
+from .views import (
+    assistant_view,
+    batch_view,
+    cache_stats_view,
+    provider_stats_view,
+)
 
 urlpatterns = [
     path("generate", assistant_view, name="model-generate"),
+    path("generate/batch", batch_view, name="model-generate-batch"),
+    path("cache", cache_stats_view, name="model-cache"),
+    path("provider", provider_stats_view, name="model-provider"),
 ]
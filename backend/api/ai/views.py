@@ -1,24 +1,58 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework.decorators import (
     api_view,
     permission_classes,
     authentication_classes,
 )
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from google import genai
 from google.genai import types
+import asyncio
 import logging
 from pydantic import BaseModel
 from typing import List, Literal
 import json
-from django_ratelimit.decorators import ratelimit
-
+from django_ratelimit.core import is_ratelimited
+from django_ratelimit.exceptions import Ratelimited
+from users.authentications import CookieJWTAuthentication
+from .cache import (
+    PLAN,
+    RATES,
+    RecommendationCache,
+    cache_key,
+    normalize_inputs,
+    normalize_rate_inputs,
+    parse_area,
+)
+from .providers import get_provider
+from .rates import RATES_CONFIG, rates_message, scale_rates
+from .singleflight import SharedFlight, SingleFlight
 
 logger = logging.getLogger(__name__)
 
+recommendation_cache = RecommendationCache(
+    settings.RECOMMENDATION_CACHE_TTL, settings.RECOMMENDATION_CACHE_SIZE
+)
 
-API_KEY = settings.GEMINI_API_KEY
+# Identical plan requests in flight at once share one generation, within
+# this process and, with ASSISTANT_COALESCE_CACHE, across processes.
+flights = SingleFlight()
+shared_flight = (
+    SharedFlight(
+        caches[settings.ASSISTANT_COALESCE_CACHE],
+        settings.ASSISTANT_DEADLINE,
+        settings.ASSISTANT_COALESCE_POLL,
+    )
+    if settings.ASSISTANT_COALESCE_CACHE
+    else None
+)
 
 
 class Resource(BaseModel):
@@ -42,35 +76,46 @@ class FarmingResponse(BaseModel):
     confidence: int
 
 
-def get_ai_response(cropType, landArea, season, soilQuality):
-    """
-    Generates an AI response using the Gemini v3 API.
-    """
+SYSTEM_INSTRUCTION = "Act as a knowledgeable farming assistant helping a farmer plan crop cultivation efficiently. You will receive inputs including the crop type, land area in square meters, soil quality, and the planting season (summer, spring, autumn, or winter). Based on these factors, provide a detailed list of required resources along with their precise quantities in kilograms. Additionally, specify the necessary tools essential for planting and maintaining the crop. Ensure the output is clear, structured, and directly actionable for the farmer."
 
-    client = genai.Client(api_key=API_KEY)
+GENERATION_CONFIG = types.GenerateContentConfig(
+    temperature=0.1,
+    top_k=1,
+    top_p=1,
+    max_output_tokens=2048,
+    system_instruction=SYSTEM_INSTRUCTION,
+    response_mime_type="application/json",
+    response_schema=FarmingResponse,
+)
 
-    sys_instruction = "Act as a knowledgeable farming assistant helping a farmer plan crop cultivation efficiently. You will receive inputs including the crop type, land area in square meters, soil quality, and the planting season (summer, spring, autumn, or winter). Based on these factors, provide a detailed list of required resources along with their precise quantities in kilograms. Additionally, specify the necessary tools essential for planting and maintaining the crop. Ensure the output is clear, structured, and directly actionable for the farmer."
+PLOT_FIELDS = ("cropType", "landArea", "season", "soilQuality")
 
-    generationConfig = types.GenerateContentConfig(
-        temperature=0.1,
-        top_k=1,
-        top_p=1,
-        max_output_tokens=2048,
-        system_instruction=sys_instruction,
-        response_mime_type="application/json",
-        response_schema=FarmingResponse,
-    )
+REQUIRED_FIELDS_ERROR = (
+    "All fields (cropType, landArea, season, soilQuality) are required"
+)
 
-    message = f"Croptype : {cropType}, LandArea : {landArea}, Soil Quality : {soilQuality}, Season : {season}"
 
+def farming_message(cropType, landArea, season, soilQuality):
+    return f"Croptype : {cropType}, LandArea : {landArea}, Soil Quality : {soilQuality}, Season : {season}"
+
+
+async def call_model(inputs, key, config, message):
     try:
-        response = client.models.generate_content(
+        response = await get_provider().agenerate_content(
             model="gemini-2.0-flash",
-            config=generationConfig,
+            config=config,
             contents=message,
         )
         if response and response.text:
-            response_dict = json.loads(response.text)
+            # Only replies matching the schema are cached, so a malformed one
+            # is not served for the whole TTL.
+            response_dict = config.response_schema.model_validate_json(
+                response.text
+            ).model_dump(mode="json")
+            if recommendation_cache.enabled:
+                await sync_to_async(recommendation_cache.set)(
+                    key, inputs, response_dict
+                )
             return response_dict
 
         return None
@@ -80,39 +125,306 @@ def get_ai_response(cropType, landArea, season, soilQuality):
         return None
 
 
-@ratelimit(key="ip", rate="50/m", block=True)
-@api_view(["POST"])
-def assistant_view(request):
+async def produce(inputs, key, config, message, refresh):
     """
-    Handles the incoming request to get farming assistance from AI.
+    Calls the model, unless another process is already generating the same
+    key, in which case its cached result is used.
     """
 
+    if shared_flight is None or refresh or not recommendation_cache.enabled:
+        return await call_model(inputs, key, config, message)
+
+    async def lookup():
+        return await sync_to_async(recommendation_cache.get)(key, record=False)
+
+    while not await shared_flight.claim(key):
+        result = await shared_flight.wait(key, lookup)
+        if result is not None:
+            return result
     try:
-        data = request.data
-        cropType = data.get("cropType")
-        landArea = data.get("landArea")
-        season = data.get("season")
-        soilQuality = data.get("soilQuality")
-
-        if not all([cropType, landArea, season, soilQuality]):
-            return Response(
-                {
-                    "error": "All fields (cropType, landArea, season, soilQuality) are required"
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        return await lookup() or await call_model(inputs, key, config, message)
+    finally:
+        await shared_flight.release(key)
 
-        ai_response = get_ai_response(cropType, landArea, season, soilQuality)
 
-        if ai_response:
-            return Response({"data": ai_response}, status=status.HTTP_200_OK)
+async def generate(inputs, config, message, refresh=False, kind=PLAN):
+    """
+    Cached model output for ``inputs``, generated from ``message`` on a
+    miss, or for every call if ``refresh`` is set. ``kind`` says what the
+    output is, so rates and plans are cached apart. Concurrent misses for
+    the same inputs share one generation.
+    """
 
-        return Response(
-            {"message": "AI response could not be generated."},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    key = cache_key(inputs, kind)
+    if recommendation_cache.enabled:
+        if refresh:
+            recommendation_cache.count("bypass")
+        else:
+            cached = await sync_to_async(recommendation_cache.get)(key)
+            if cached is not None:
+                return cached
+
+    return await flights.do(key, lambda: produce(inputs, key, config, message, refresh))
+
+
+def rated_area(landArea):
+    """
+    Land area in hectares when plans are scaled from per-square-metre
+    rates, or None to generate a plan for the exact area.
+    """
+
+    if not settings.ASSISTANT_PER_UNIT_RATES:
+        return None
+    hectares = parse_area(landArea)
+    return hectares if hectares else None
+
+
+async def get_ai_response(cropType, landArea, season, soilQuality, refresh=False):
+    """
+    Generates an AI response using the Gemini v3 API. Plans for the same
+    normalized inputs come from the recommendation cache unless
+    ``refresh`` is set, which regenerates and replaces the cached plan.
+    With ASSISTANT_PER_UNIT_RATES, the model gives per-square-metre rates
+    for the crop, season and soil once, and plans for any land area are
+    scaled from them.
+    """
+
+    hectares = rated_area(landArea)
+    if hectares is not None:
+        rates = await generate(
+            normalize_rate_inputs(cropType, season, soilQuality),
+            RATES_CONFIG,
+            rates_message(cropType, season, soilQuality),
+            refresh,
+            RATES,
+        )
+        if not rates:
+            return None
+        try:
+            return scale_rates(rates, landArea, hectares)
+        except ValueError as e:
+            logger.error("Invalid rates for %s: %s", cropType, str(e))
+            return None
+
+    return await generate(
+        normalize_inputs(cropType, landArea, season, soilQuality),
+        GENERATION_CONFIG,
+        farming_message(cropType, landArea, season, soilQuality),
+        refresh,
+    )
+
+
+async def authenticate(request):
+    """
+    The user for the request's access cookie, checked as the DRF views
+    do, or None.
+    """
+
+    try:
+        result = await sync_to_async(CookieJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+async def check_access(request, group, rate):
+    """
+    Applies the IP rate limit and the access-cookie check for an async view.
+    Returns ``(data, None)`` with the JSON body, or ``(None, response)``
+    with the error to send.
+    """
+
+    limited = await sync_to_async(is_ratelimited)(
+        request, group=group, key="ip", rate=rate, increment=True
+    )
+    if limited:
+        raise Ratelimited()
+
+    user = await authenticate(request)
+    if user is None:
+        return None, JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None, JsonResponse(
+            {"error": "Request body must be JSON"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return (data if isinstance(data, dict) else {}), None
+
+
+def parse_refresh(data):
+    return str(data.get("refresh", "")).lower() in ("true", "1", "yes")
+
+
+@csrf_exempt
+@require_POST
+async def assistant_view(request):
+    """
+    Handles the incoming request to get farming assistance from AI. A
+    plain async view rather than a DRF one, so under ASGI the model call is
+    awaited; if the client disconnects the view is cancelled with it.
+    """
+
+    data, error = await check_access(request, "ai.views.assistant_view", "50/m")
+    if error:
+        return error
+
+    cropType = data.get("cropType")
+    landArea = data.get("landArea")
+    season = data.get("season")
+    soilQuality = data.get("soilQuality")
+    refresh = parse_refresh(data)
+
+    if not all([cropType, landArea, season, soilQuality]):
+        return JsonResponse(
+            {"error": REQUIRED_FIELDS_ERROR},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        ai_response = await asyncio.wait_for(
+            get_ai_response(cropType, landArea, season, soilQuality, refresh=refresh),
+            settings.ASSISTANT_DEADLINE,
+        )
+    except asyncio.TimeoutError:
+        return JsonResponse(
+            {"message": "AI response timed out."},
+            status=status.HTTP_504_GATEWAY_TIMEOUT,
         )
     except Exception as e:
-        return Response(
+        return JsonResponse(
             {"error": f"Server Error: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
+
+    if ai_response:
+        return JsonResponse({"data": ai_response}, status=status.HTTP_200_OK)
+
+    return JsonResponse(
+        {"message": "AI response could not be generated."},
+        status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    )
+
+
+async def plan_lines(semaphore, plot, indices, refresh):
+    """
+    NDJSON lines for the plots at ``indices``, which share ``plot``'s
+    normalized inputs: its plan, or why there is none. A failure only
+    fails these lines, not the rest of the batch.
+    """
+
+    async with semaphore:
+        try:
+            plan = await asyncio.wait_for(
+                get_ai_response(
+                    *(plot[field] for field in PLOT_FIELDS), refresh=refresh
+                ),
+                settings.ASSISTANT_DEADLINE,
+            )
+            result = (
+                {"data": plan}
+                if plan
+                else {"error": "AI response could not be generated."}
+            )
+        except asyncio.TimeoutError:
+            result = {"error": "AI response timed out."}
+        except Exception as e:
+            logger.exception("Batch plan generation failed")
+            result = {"error": f"Server Error: {str(e)}"}
+    return [json.dumps({"index": index, **result}) + "\n" for index in indices]
+
+
+async def stream_plans(plots, refresh):
+    """
+    Generates the plans at most ASSISTANT_BATCH_CONCURRENCY at a time and
+    yields each as soon as it is ready. Plots with the same normalized
+    inputs share one generation. Pending ones are cancelled if the client
+    goes away.
+    """
+
+    groups = {}
+    for index, plot in enumerate(plots):
+        key = cache_key(normalize_inputs(*(plot[field] for field in PLOT_FIELDS)))
+        groups.setdefault(key, (plot, []))[1].append(index)
+
+    semaphore = asyncio.Semaphore(settings.ASSISTANT_BATCH_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(plan_lines(semaphore, plot, indices, refresh))
+        for plot, indices in groups.values()
+    ]
+    try:
+        for done in asyncio.as_completed(tasks):
+            for line in await done:
+                yield line
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@csrf_exempt
+@require_POST
+async def batch_view(request):
+    """
+    Plans for a list of plots, streamed back as NDJSON in the order they
+    finish. Each line carries the plot's ``index`` in the request and its
+    ``data``, or an ``error`` if that plot failed.
+    """
+
+    data, error = await check_access(request, "ai.views.batch_view", "10/m")
+    if error:
+        return error
+
+    plots = data.get("plots")
+    if not isinstance(plots, list) or not plots:
+        return JsonResponse(
+            {"error": "plots must be a non-empty list"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(plots) > settings.ASSISTANT_BATCH_MAX_PLOTS:
+        return JsonResponse(
+            {
+                "error": f"At most {settings.ASSISTANT_BATCH_MAX_PLOTS} plots per request"
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    for index, plot in enumerate(plots):
+        if not isinstance(plot, dict) or not all(plot.get(f) for f in PLOT_FIELDS):
+            return JsonResponse(
+                {"error": f"Plot {index}: {REQUIRED_FIELDS_ERROR}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    return StreamingHttpResponse(
+        stream_plans(plots, parse_refresh(data)),
+        content_type="application/x-ndjson",
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def cache_stats_view(request):
+    """
+    Recommendation cache counters for this process, its size, and how many
+    requests were coalesced into another's generation.
+    """
+
+    stats = recommendation_cache.stats()
+    stats["coalescing"] = flights.stats()
+    if shared_flight is not None:
+        stats["shared_coalescing"] = shared_flight.stats()
+    return Response({"data": stats}, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def provider_stats_view(request):
+    """
+    Model call latency and connection reuse counters for this process.
+    """
+
+    return Response({"data": get_provider().snapshot()}, status=status.HTTP_200_OK)
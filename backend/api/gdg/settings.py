@@ -27,6 +27,51 @@ SECRET_KEY = os.getenv("DJANGO_SECRET_KEY")
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Connection pool shared by all Gemini calls in a process, and timeouts in
+# seconds: each HTTP request, and a whole call.
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "20"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", "60"))
+
+# Seconds the async assistant endpoint waits for a plan, cache lookup
+# included, before answering 504.
+ASSISTANT_DEADLINE = float(os.getenv("ASSISTANT_DEADLINE", "60"))
+
+# Ask the model for per-square-metre rates for each crop, season and soil
+# once, and scale plans to the requested land area locally, instead of
+# generating a plan per land area.
+ASSISTANT_PER_UNIT_RATES = os.getenv("ASSISTANT_PER_UNIT_RATES", "False").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+
+# Cache alias used to coalesce identical plan requests across processes;
+# empty coalesces them within each process only. Waiting processes check
+# for the result every ASSISTANT_COALESCE_POLL seconds.
+ASSISTANT_COALESCE_CACHE = os.getenv(
+    "ASSISTANT_COALESCE_CACHE", "shared" if os.getenv("SHARED_CACHE_URL") else ""
+)
+ASSISTANT_COALESCE_POLL = float(os.getenv("ASSISTANT_COALESCE_POLL", "0.25"))
+
+# Plots accepted per batch request, and how many of its plans are
+# generated at once.
+ASSISTANT_BATCH_MAX_PLOTS = int(os.getenv("ASSISTANT_BATCH_MAX_PLOTS", "100"))
+ASSISTANT_BATCH_CONCURRENCY = int(os.getenv("ASSISTANT_BATCH_CONCURRENCY", "8"))
+
+# "gemini", or "stub" for canned offline replies in load tests.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "200"))
+LLM_STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", "0"))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "0"))
+
+# Farming plans cached per normalized input, for this many seconds, keeping
+# at most this many. Either set to 0 disables the cache.
+RECOMMENDATION_CACHE_TTL = int(
+    os.getenv("RECOMMENDATION_CACHE_TTL", str(7 * 24 * 60 * 60))
+)
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000"))
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
 
@@ -137,6 +182,19 @@ else:
         }
     }
 
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+# Redis cache shared by all workers, e.g. redis://host:6379/0; needs the
+# redis package.
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL")
+if SHARED_CACHE_URL:
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": SHARED_CACHE_URL,
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
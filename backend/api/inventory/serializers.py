@@ -7,3 +7,12 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = "__all__"
         read_only_fields = ["owner", "created_at"]
+
+
+class StockUpdateSerializer(serializers.Serializer):
+    slug = serializers.SlugField(max_length=255)
+    delta = serializers.IntegerField()
+
+
+class StockSyncSerializer(serializers.Serializer):
+    updates = StockUpdateSerializer(many=True)
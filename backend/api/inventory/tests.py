@@ -1,3 +1,82 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from .models import Product
 
-# Create your tests here.
+URL = "/api/v1/inventory/stock/sync"
+
+
+class StockSyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("farmer")
+        self.other = User.objects.create_user("neighbour")
+        for owner in (self.user, self.other):
+            for slug, stock in (("apple", 5), ("pear", 1)):
+                Product.objects.create(
+                    name=slug,
+                    slug=slug,
+                    owner=owner,
+                    category="Fruit",
+                    price=1,
+                    stock=stock,
+                    region="North",
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, updates):
+        return self.client.post(URL, {"updates": updates}, format="json")
+
+    def stock(self, owner, slug):
+        return Product.objects.get(owner=owner, slug=slug).stock
+
+    def test_deltas_are_summed_per_product(self):
+        response = self.sync(
+            [
+                {"slug": "apple", "delta": 2},
+                {"slug": "apple", "delta": 1},
+                {"slug": "pear", "delta": 3},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"updated": {"apple": 8, "pear": 4}})
+
+    def test_stock_never_drops_below_zero(self):
+        response = self.sync([{"slug": "pear", "delta": -5}])
+        self.assertEqual(response.data, {"updated": {"pear": 0}})
+
+    def test_only_the_users_products_change(self):
+        self.sync([{"slug": "apple", "delta": -2}, {"slug": "missing", "delta": 1}])
+        self.assertEqual(self.stock(self.user, "apple"), 3)
+        self.assertEqual(self.stock(self.other, "apple"), 5)
+
+    def test_zero_net_deltas_are_skipped(self):
+        response = self.sync(
+            [{"slug": "apple", "delta": 2}, {"slug": "apple", "delta": -2}]
+        )
+        self.assertEqual(response.data, {"updated": {}})
+
+    def test_invalid_updates_are_rejected(self):
+        response = self.sync([{"slug": "apple"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(self.user, "apple"), 5)
+
+    def test_bodies_that_are_not_objects_are_rejected(self):
+        for body in ([{"slug": "apple", "delta": 1}], "apple"):
+            response = self.client.post(URL, body, format="json")
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(self.user, "apple"), 5)
+
+    def test_requires_authentication(self):
+        response = APIClient().post(URL, {"updates": []}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_rate_limit_is_per_user(self):
+        for _ in range(50):
+            self.assertEqual(self.sync([]).status_code, 200)
+        self.assertEqual(self.sync([]).status_code, 429)
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.sync([]).status_code, 200)
@@ -4,6 +4,7 @@ from .views import (
     ProductListView,
     ProductUpdateView,
     ProductDeleteView,
+    StockSyncView,
 )
 
 urlpatterns = [
@@ -11,4 +12,5 @@ urlpatterns = [
     path("list", ProductListView.as_view(), name="list"),
     path("update/<slug:slug>/", ProductUpdateView.as_view(), name="update"),
     path("delete/<slug:slug>/", ProductDeleteView.as_view(), name="delete"),
+    path("stock/sync", StockSyncView.as_view(), name="stock-sync"),
 ]
@@ -1,6 +1,12 @@
-from rest_framework import generics
+from rest_framework import generics, status
+from rest_framework.response import Response
+from rest_framework.throttling import UserRateThrottle
+from rest_framework.views import APIView
 from .models import Product
-from .serializers import ProductSerializer
+from .serializers import ProductSerializer, StockSyncSerializer
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
 from django.utils.decorators import method_decorator
 from django_ratelimit.decorators import ratelimit
 
@@ -46,3 +52,53 @@ class ProductDeleteView(generics.DestroyAPIView):
     def get_queryset(self):
         queryset = Product.objects.filter(owner=self.request.user)
         return queryset
+
+
+class StockSyncThrottle(UserRateThrottle):
+    """
+    Rate limit per authenticated user. The requests all come from the
+    vision service's host, so an IP limit would be shared by every user.
+    """
+
+    scope = "stock_sync"
+    rate = "50/m"
+
+
+class StockSyncView(APIView):
+    """
+    Applies a batch of net stock changes, e.g. from the vision service's
+    camera counts, to the user's products in a single UPDATE. Stock never
+    drops below zero.
+    """
+
+    throttle_classes = [StockSyncThrottle]
+
+    def post(self, request):
+        serializer = StockSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        deltas = {}
+        for update in serializer.validated_data["updates"]:
+            deltas[update["slug"]] = deltas.get(update["slug"], 0) + update["delta"]
+        deltas = {slug: delta for slug, delta in deltas.items() if delta}
+
+        if deltas:
+            with transaction.atomic():
+                Product.objects.filter(owner=request.user, slug__in=deltas).update(
+                    stock=Case(
+                        *[
+                            When(
+                                slug=slug,
+                                then=Greatest(F("stock") + Value(delta), Value(0)),
+                            )
+                            for slug, delta in deltas.items()
+                        ],
+                        output_field=IntegerField(),
+                    )
+                )
+
+        products = Product.objects.filter(owner=request.user, slug__in=deltas)
+        return Response(
+            {"updated": {product.slug: product.stock for product in products}},
+            status=status.HTTP_200_OK,
+        )
@@ -0,0 +1,63 @@
+import re
+import time
+from collections import OrderedDict
+
+# Words that point back at earlier turns, e.g. "how do I delete it?".
+CONTEXT_WORDS = frozenset(
+    "it its this that these those they them their he she him her above "
+    "previous earlier again else more another same".split()
+)
+
+
+def normalize(message):
+    """
+    Cache key for a message: lowercased, punctuation dropped and
+    whitespace collapsed, so "Hello!" and "hello" share a reply.
+    """
+    return " ".join(re.findall(r"[\w']+", message.lower()))
+
+
+def is_context_free(key):
+    return not CONTEXT_WORDS.intersection(key.split())
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized replies that expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] > self.ttl:
+            del self.entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = (value, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
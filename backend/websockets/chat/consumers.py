@@ -1,14 +1,34 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
-from google import genai
+from contextlib import asynccontextmanager
+from django.conf import settings
 from google.genai import types
 from pydantic import BaseModel
-import os
+from . import metrics
+from .cache import ResponseCache, is_context_free, normalize
+from .intents import local_answer
+from .limiter import UpstreamBusy, UpstreamLimiter
+from .history import (
+    HistoryPolicy,
+    content_text,
+    estimate_tokens,
+    merge_contents,
+    summarize,
+)
+from .providers import get_provider
+from .sessions import SESSION_ID_PATTERN, SessionManager, SessionStore
+from .streaming import MessageStream
+from urllib.parse import parse_qs
+import asyncio
 import enum
+import itertools
 import json
+import logging
+import sqlite3
+import time
+import uuid
+import weakref
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-
-client = genai.Client(api_key=API_KEY)
+logger = logging.getLogger(__name__)
 
 
 class ResponseType(enum.Enum):
@@ -21,7 +41,7 @@ class ResponseType(enum.Enum):
 class BotResponse(BaseModel):
     type: ResponseType
     message: str
-    steps: list[str] = None
+    steps: list[str] | None = None
 
 
 chat_instructions = """
@@ -90,29 +110,307 @@ chat_config = types.GenerateContentConfig(
     response_mime_type="application/json",
 )
 
+CHAT_MODEL = "gemini-2.0-flash"
+
+response_cache = ResponseCache(settings.CHAT_CACHE_SIZE, settings.CHAT_CACHE_TTL)
+metrics.CACHE_ENTRIES.collect = lambda: {(): len(response_cache.entries)}
+
+history_policy = HistoryPolicy(
+    settings.CHAT_HISTORY_TURNS, settings.CHAT_HISTORY_TOKEN_BUDGET
+)
+upstream = UpstreamLimiter(
+    settings.CHAT_MAX_CONCURRENT_CALLS,
+    settings.CHAT_MAX_WAITING_CALLS,
+    settings.CHAT_CALL_WAIT_TIMEOUT,
+)
+metrics.UPSTREAM_CALLS.collect = lambda: {
+    ("in_flight",): upstream.in_flight,
+    ("waiting",): upstream.waiting,
+}
+
+ERROR_REPLY = json.dumps({"type": "error", "message": "Internal server error:"})
+BUSY_REPLY = json.dumps(
+    {"type": "busy", "message": "The assistant is busy, please try again shortly."}
+)
+
+
+@asynccontextmanager
+async def upstream_call():
+    """
+    Holds an upstream slot for one LLM call and records its round-trip
+    time. Yields the time the call started.
+    """
+    async with upstream.slot():
+        started = time.perf_counter()
+        try:
+            yield started
+        except Exception:
+            metrics.GEMINI_SECONDS.observe(
+                time.perf_counter() - started, outcome="error"
+            )
+            raise
+        metrics.GEMINI_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+
+
+connection_ids = itertools.count(1)
+open_consumers = weakref.WeakSet()
+sessions = SessionManager(
+    SessionStore(settings.CHAT_SESSION_DB, settings.CHAT_SESSION_TTL),
+    settings.CHAT_MAX_RESIDENT_SESSIONS,
+)
+metrics.SESSIONS.collect = lambda: {
+    ("resident",): len(sessions.resident),
+    ("offloaded",): sum(
+        1 for consumer in list(open_consumers) if consumer.chat is None
+    ),
+}
+metrics.HISTORY_TOKENS.collect = lambda: {
+    (str(consumer.connection_id),): consumer.history_tokens()
+    for consumer in list(open_consumers)
+}
+metrics.HISTORY_BYTES.collect = lambda: {
+    (str(consumer.connection_id),): consumer.history_bytes()
+    for consumer in list(open_consumers)
+}
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         await self.accept()
         print("WebSocket Connected Successfully.")
-        self.chat = client.aio.chats.create(
-            model="gemini-2.0-flash", history=None, config=chat_config
-        )
+        metrics.CONNECTIONS.inc()
+        # Clients opt in to partial frames with ws/chat/?stream=1.
+        query = parse_qs(self.scope["query_string"].decode())
+        stream = query.get("stream", [str(settings.CHAT_STREAMING)])[0]
+        self.streaming = stream.lower() in ("true", "1", "yes")
+        self.connection_id = next(connection_ids)
+        # A client-chosen ?session=<id> makes the session resumable after a
+        # reconnect; other sessions get a throwaway id for offloading.
+        session_id = query.get("session", [""])[0]
+        self.resumable = bool(SESSION_ID_PATTERN.match(session_id))
+        self.session_id = session_id if self.resumable else uuid.uuid4().hex
+        self.stored = self.resumable
+        self.session_lock = asyncio.Lock()
+        self.answering = False
+        self.closed = False
+        # Created, or restored from the store, on the first message.
+        self.summary = ""
+        self.chat = None
+        open_consumers.add(self)
+        # Messages are answered one at a time, in order, so turns on the
+        # chat session never interleave.
+        self.messages = asyncio.Queue(settings.CHAT_SOCKET_QUEUE_SIZE)
+        self.worker = asyncio.create_task(self.process_messages())
 
     async def disconnect(self, code):
         print(f"WebSocket Disconnected. Code: {code}")
+        metrics.CONNECTIONS.dec()
+        open_consumers.discard(self)
+        self.worker.cancel()
+        self.closed = True
+        sessions.discard(self)
+        async with self.session_lock:
+            try:
+                if self.resumable and self.chat is not None:
+                    history = self.chat.get_history(curated=True)
+                    await sessions.save(self.session_id, self.summary, history)
+                elif not self.resumable and self.stored:
+                    await sessions.delete(self.session_id)
+            except sqlite3.Error:
+                logger.exception("Could not store chat session %s", self.session_id)
+
+    async def ensure_resident(self):
+        """
+        Brings the chat session back into memory if it was offloaded, or
+        restores a resumed one, and marks it as the most recently active.
+        """
+        async with self.session_lock:
+            if self.chat is None:
+                state = await sessions.load(self.session_id) if self.stored else None
+                history = []
+                if state is not None:
+                    self.summary, history = state
+                self.chat = self.create_chat(history)
+        await sessions.touch(self)
+
+    async def offload(self):
+        """
+        Moves the chat session to the store. Returns False, with the session
+        still in memory, if it is answering a message or could not be saved.
+        """
+        async with self.session_lock:
+            if self.chat is None:
+                return True
+            # The exchange in flight would be lost from the saved history.
+            if self.answering:
+                return False
+            history = self.chat.get_history(curated=True)
+            try:
+                await sessions.save(self.session_id, self.summary, history)
+            except sqlite3.Error:
+                logger.exception("Could not offload chat session %s", self.session_id)
+                return False
+            self.chat = None
+            self.summary = ""
+            self.stored = True
+            return True
+
+    def create_chat(self, history):
+        """
+        Starts a chat session from ``history``, with the summary of any
+        compacted turns appended to the system instruction.
+        """
+        config = chat_config
+        if self.summary:
+            config = chat_config.model_copy(
+                update={
+                    "system_instruction": f"{chat_instructions}\n"
+                    f"Summary of the earlier conversation: {self.summary}"
+                }
+            )
+        return get_provider().create_chat(
+            model=CHAT_MODEL, history=history, config=config
+        )
+
+    async def compact_history(self):
+        older, recent = history_policy.split(self.chat.get_history(curated=True))
+        if not older:
+            return
+        if settings.CHAT_HISTORY_SUMMARIZE:
+            try:
+                async with upstream.slot():
+                    self.summary = await summarize(
+                        get_provider(), CHAT_MODEL, self.summary, older
+                    )
+            except UpstreamBusy:
+                # Try again after the next turn rather than add to the load.
+                return
+            except Exception:
+                logger.exception("Chat history summarization failed")
+        self.chat = self.create_chat(merge_contents(recent))
+        metrics.HISTORY_COMPACTIONS.inc()
+
+    def history_tokens(self):
+        if self.chat is None:
+            return 0
+        history = self.chat.get_history(curated=True)
+        return estimate_tokens(history) + len(self.summary) // 4
+
+    def history_bytes(self):
+        if self.chat is None:
+            return 0
+        history = self.chat.get_history()
+        text = self.summary + "".join(content_text(content) for content in history)
+        return len(text.encode())
 
     async def receive(self, text_data=None, bytes_data=None):
         if text_data is None:
             await self.send(
                 json.dumps({"type": "error", "message": f"No message received."})
             )
+            return
 
         try:
+            self.messages.put_nowait(text_data)
+        except asyncio.QueueFull:
+            metrics.BUSY.inc(reason="socket_queue_full")
+            await self.send(BUSY_REPLY)
+
+    async def process_messages(self):
+        while True:
+            text_data = await self.messages.get()
+            self.answering = True
+            try:
+                await self.answer(text_data)
+            except Exception:
+                # One failed message must not stop the socket's worker.
+                logger.exception("Chat message handling failed")
+                await self.send(ERROR_REPLY)
+            finally:
+                self.answering = False
+
+    async def answer(self, text_data):
+        await self.ensure_resident()
+
+        if settings.CHAT_LOCAL_INTENTS:
+            intent, answer = local_answer(text_data, settings.CHAT_INTENT_THRESHOLD)
+            metrics.INTENTS.inc(intent=intent, answered="local" if answer else "model")
+            if answer is not None:
+                reply = json.dumps(BotResponse(**answer).model_dump(mode="json"))
+                self.record_exchange(text_data, reply)
+                await self.send(reply)
+                return
+
+        # Only first-turn messages and messages that do not refer back to
+        # the conversation are cached, since their replies do not depend on
+        # earlier turns.
+        key = normalize(text_data)
+        first_turn = not self.chat.get_history()
+        cacheable = bool(key) and (first_turn or is_context_free(key))
+        if cacheable:
+            cached = response_cache.get(key)
+            metrics.CACHE_REQUESTS.inc(result="miss" if cached is None else "hit")
+            if cached is not None:
+                self.record_exchange(text_data, cached)
+                await self.send(cached)
+                await self.compact_history()
+                return
+        else:
+            metrics.CACHE_REQUESTS.inc(result="bypass")
+
+        try:
+            if self.streaming:
+                reply = await self.stream_reply(text_data)
+            else:
+                reply = await self.complete_reply(text_data)
+            if cacheable and json.loads(reply).get("type") != "error":
+                response_cache.set(key, reply)
+            await self.send(reply)
+        except UpstreamBusy:
+            await self.send(BUSY_REPLY)
+            return
+        except Exception:
+            logger.exception("Chat reply failed")
+            await self.send(ERROR_REPLY)
+            return
+
+        # Compacting after the reply keeps summarization off the user's wait.
+        await self.compact_history()
+
+    async def complete_reply(self, text_data):
+        async with upstream_call():
             response = await self.chat.send_message(message=text_data)
-            response_data = json.loads(response.text)
-            await self.send(json.dumps(response_data))
-        except Exception as e:
-            await self.send(
-                json.dumps({"type": "error", "message": f"Internal server error:"})
-            )
+        return json.dumps(json.loads(response.text))
+
+    async def stream_reply(self, text_data):
+        """
+        Forwards the reply message as it is generated in
+        ``{"type": "partial", "delta": "..."}`` frames and returns the
+        complete, validated BotResponse for the final frame.
+        """
+        message = MessageStream()
+        first_chunk = True
+        async with upstream_call() as started:
+            async for chunk in await self.chat.send_message_stream(message=text_data):
+                if first_chunk:
+                    metrics.GEMINI_FIRST_CHUNK_SECONDS.observe(
+                        time.perf_counter() - started
+                    )
+                    first_chunk = False
+                delta = message.feed(chunk.text or "")
+                if delta:
+                    await self.send(json.dumps({"type": "partial", "delta": delta}))
+        response = BotResponse.model_validate_json(message.text)
+        return json.dumps(response.model_dump(mode="json"))
+
+    def record_exchange(self, text_data, reply):
+        """
+        Adds an exchange answered without the model to the chat history so
+        later turns see it.
+        """
+        self.chat.record_history(
+            user_input=types.UserContent(parts=[types.Part.from_text(text=text_data)]),
+            model_output=[types.ModelContent(parts=[types.Part.from_text(text=reply)])],
+            automatic_function_calling_history=[],
+            is_valid=True,
+        )
@@ -0,0 +1,115 @@
+import json
+from google.genai import types
+
+SUMMARY_PROMPT = """
+Summarize this conversation between a farmer and the inventory assistant in
+at most three sentences. Keep names of items, quantities, crops and any
+open questions. Reply with the summary only.
+"""
+
+summary_config = types.GenerateContentConfig(
+    system_instruction=SUMMARY_PROMPT,
+    temperature=0.0,
+    max_output_tokens=160,
+)
+
+
+def content_text(content):
+    return "".join(part.text or "" for part in content.parts or [])
+
+
+def estimate_tokens(contents):
+    """
+    Rough token count for Gemini models, at about four characters per token.
+    """
+    return sum(len(content_text(content)) for content in contents) // 4 + 1
+
+
+def split_turns(contents):
+    """
+    Groups history into turns, each starting at a user message. Streamed
+    replies are recorded as one model content per chunk, so a turn can
+    hold several model contents.
+    """
+    turns = []
+    for content in contents:
+        if content.role == "user" or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+class HistoryPolicy:
+    """
+    Bounds a chat to ``max_turns`` turns and ``token_budget`` tokens. Once
+    either is exceeded the history is cut back to the newest half of the
+    window, still within budget, so older turns are summarized every few
+    turns rather than on every message.
+    """
+
+    def __init__(self, max_turns, token_budget):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+
+    def split(self, history):
+        """
+        Returns ``(older, recent)`` contents; ``older`` is empty while the
+        history is within bounds.
+        """
+        turns = split_turns(history)
+        if (
+            len(turns) <= self.max_turns
+            and estimate_tokens(history) <= self.token_budget
+        ):
+            return [], history
+
+        recent = turns[-max(self.max_turns // 2, 1) :]
+        while len(recent) > 1 and estimate_tokens(sum(recent, [])) > self.token_budget:
+            recent = recent[1:]
+        older = turns[: len(turns) - len(recent)]
+        return sum(older, []), sum(recent, [])
+
+
+def merge_contents(contents):
+    """
+    Joins consecutive contents of the same role, such as the chunks of a
+    streamed reply, into one content each.
+    """
+    merged = []
+    for content in contents:
+        if merged and merged[-1].role == content.role:
+            merged[-1] = types.Content(
+                role=content.role,
+                parts=[
+                    types.Part.from_text(
+                        text=content_text(merged[-1]) + content_text(content)
+                    )
+                ],
+            )
+        else:
+            merged.append(content)
+    return merged
+
+
+def reply_message(text):
+    try:
+        return json.loads(text)["message"]
+    except (ValueError, TypeError, KeyError):
+        return text
+
+
+def transcript(summary, contents):
+    lines = [f"Earlier summary: {summary}"] if summary else []
+    for content in merge_contents(contents):
+        if content.role == "user":
+            lines.append(f"Farmer: {content_text(content)}")
+        else:
+            lines.append(f"Assistant: {reply_message(content_text(content))}")
+    return "\n".join(lines)
+
+
+async def summarize(provider, model, summary, contents):
+    response = await provider.agenerate_content(
+        model=model, contents=transcript(summary, contents), config=summary_config
+    )
+    return (response.text or "").strip() or summary
@@ -0,0 +1,205 @@
+import math
+import re
+import numpy as np
+from .cache import normalize
+
+GREETING = "greeting"
+OUT_OF_SCOPE = "out_of_scope"
+IN_SCOPE = "in_scope"
+
+REFUSAL = "Sorry, I can't assist with that."
+
+# Whole-message greetings, after normalization.
+GREETING_PATTERN = re.compile(
+    r"^(hi|hello|hey|hiya|greetings|namaste|good (morning|afternoon|evening))"
+    r"( there| assistant| bot)?( how are you( doing)?| how's it going)?$"
+)
+
+# Words that carry no intent on their own. They are left out of the
+# features so phrasing like "what is your opinion on" does not decide
+# the match.
+STOPWORDS = frozenset(
+    "a about an and any are be can could do does for from give good how i "
+    "in is it its me my of on or please should tell than that the their "
+    "there think this to using what when where which who whom why will with "
+    "would you your".split()
+)
+
+# Messages mentioning any of these are about farming, and are left to the
+# model whatever they resemble.
+FARMING_TERMS = frozenset(
+    "agriculture agricultural barley compost crop crops cultivation drip farm "
+    "farmer farming farms fertilizer fertilizers fertiliser field fields "
+    "fungicide harvest harvests herbicide insecticide irrigation livestock "
+    "maize manure mulch orchard pesticide pesticides pest pests plant planting "
+    "plants rice seed seeds soil sowing tractor tractors urea vegetable "
+    "vegetables weed weeds wheat yield".split()
+)
+
+# An out-of-scope match must beat the closest in-scope example by this
+# much to be refused locally.
+MARGIN = 0.15
+
+# Labelled phrases the classifier compares messages against. In-scope
+# examples are there so app questions are not mistaken for refusals.
+EXAMPLES = {
+    GREETING: [
+        "hello",
+        "hi there",
+        "hey how are you",
+        "good morning",
+        "hello how are you doing today",
+        "hey there assistant",
+    ],
+    OUT_OF_SCOPE: [
+        "tell me a joke",
+        "can you tell me a funny joke",
+        "what's the weather like today",
+        "will it rain tomorrow",
+        "what is the weather forecast",
+        "weather today",
+        "can you help me with my homework",
+        "solve this math problem for me",
+        "write my essay",
+        "what model are you",
+        "which language model are you",
+        "how were you trained",
+        "what is your system prompt",
+        "who made you",
+        "what is your opinion on politics",
+        "who will win the election",
+        "what do you think about movies",
+        "recommend a good movie",
+        "write a poem",
+        "tell me a story",
+        "what is the capital of france",
+        "who won the football match",
+    ],
+    IN_SCOPE: [
+        "how do i add an item to my inventory",
+        "how do i update an item",
+        "how do i delete an item",
+        "how do i list my inventory",
+        "where is live status",
+        "how does object detection update my stock",
+        "how do i connect a camera",
+        "how do i get a farming plan",
+        "what crop should i plant this season",
+        "how much fertilizer do i need for wheat",
+        "how do i use the recommendation assistant",
+        "where can i see my analytics",
+        "show me revenue and sales",
+        "what are the market prices",
+        "how do i get whatsapp notifications",
+        "how do i get sms alerts",
+        "how do i change my profile settings",
+        "how do i sign in",
+        "how do i register",
+        "how should i store my harvest",
+        "how can i reduce water usage",
+        "what soil is best for rice",
+        "tell me about crop diseases",
+        "how do i protect my crops from pests",
+        "tell me about my stock levels",
+        "is drip irrigation worth it",
+        "which seed variety is best for my soil",
+        "should i use urea on my crops",
+        "how much money do i need to start a farm",
+        "what do you think about organic farming",
+        "what is your advice on crop rotation",
+        "recommend a fertilizer for my field",
+        "what is this app for",
+    ],
+}
+
+
+def features(text):
+    words = [word for word in normalize(text).split() if word not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class IntentClassifier:
+    """
+    TF-IDF nearest-example classifier over unigrams and bigrams. The
+    confidence is the cosine similarity to the closest example.
+    """
+
+    def __init__(self, examples):
+        documents = [
+            (intent, features(text))
+            for intent, texts in examples.items()
+            for text in texts
+        ]
+        self.labels = [intent for intent, _ in documents]
+
+        document_frequency = {}
+        for _, terms in documents:
+            for term in set(terms):
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        self.vocabulary = {term: index for index, term in enumerate(document_frequency)}
+        self.idf = np.zeros(len(self.vocabulary))
+        for term, count in document_frequency.items():
+            self.idf[self.vocabulary[term]] = (
+                math.log((1 + len(documents)) / (1 + count)) + 1
+            )
+
+        self.matrix = np.stack([self.vectorize(terms) for _, terms in documents])
+
+    def vectorize(self, terms):
+        vector = np.zeros(len(self.vocabulary))
+        for term in terms:
+            index = self.vocabulary.get(term)
+            if index is not None:
+                vector[index] += 1
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def scores(self, text):
+        """
+        Cosine similarity of ``text`` to the closest example of each intent.
+        """
+        similarities = self.matrix @ self.vectorize(features(text))
+        best = {IN_SCOPE: 0.0}
+        for label, similarity in zip(self.labels, similarities):
+            best[label] = max(best.get(label, 0.0), float(similarity))
+        return best
+
+    def classify(self, text):
+        scores = self.scores(text)
+        intent = max(scores, key=scores.get)
+        return intent, scores[intent]
+
+
+classifier = IntentClassifier(EXAMPLES)
+
+
+def greeting_reply(text):
+    first = normalize(text).split()[0]
+    word = first.capitalize() if first in ("hi", "hello", "hey") else "Hello"
+    return f"{word}! How can I assist you today?"
+
+
+def local_answer(text, threshold):
+    """
+    Returns ``(intent, BotResponse dict)`` for messages that can be
+    answered without the model, or ``(intent, None)`` to fall back to it.
+    """
+    if GREETING_PATTERN.match(normalize(text)):
+        return GREETING, {"type": "greeting", "message": greeting_reply(text)}
+
+    if FARMING_TERMS.intersection(normalize(text).split()):
+        return IN_SCOPE, None
+
+    scores = classifier.scores(text)
+    intent = max(scores, key=scores.get)
+    confidence = scores[intent]
+    if (
+        confidence < threshold
+        or intent == IN_SCOPE
+        or confidence - scores[IN_SCOPE] < MARGIN
+    ):
+        return intent, None
+    if intent == GREETING:
+        return intent, {"type": "greeting", "message": greeting_reply(text)}
+    return intent, {"type": "response", "message": REFUSAL}
@@ -0,0 +1,50 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from . import metrics
+
+
+class UpstreamBusy(Exception):
+    pass
+
+
+class UpstreamLimiter:
+    """
+    Caps in-flight LLM calls for the whole process. Up to ``max_waiting``
+    callers queue for a slot for at most ``timeout`` seconds; beyond that
+    they get UpstreamBusy straight away instead of piling up.
+    """
+
+    def __init__(self, max_concurrent, max_waiting, timeout):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.waiting = 0
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        # Counted rather than read from the semaphore, which only updates
+        # once waiters get to run.
+        if self.in_flight + self.waiting >= self.max_concurrent + self.max_waiting:
+            metrics.BUSY.inc(reason="queue_full")
+            raise UpstreamBusy("Too many requests are waiting.")
+
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.BUSY.inc(reason="timeout")
+            raise UpstreamBusy("Timed out waiting for an upstream slot.")
+        finally:
+            self.waiting -= 1
+        metrics.UPSTREAM_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
@@ -0,0 +1,54 @@
+from vision.metrics import Counter, Gauge, Histogram
+
+GEMINI_SECONDS = Histogram(
+    "chat_gemini_seconds",
+    "Gemini round-trip time per chat message.",
+    ["outcome"],
+)
+GEMINI_FIRST_CHUNK_SECONDS = Histogram(
+    "chat_gemini_first_chunk_seconds",
+    "Time to the first streamed Gemini chunk per chat message.",
+)
+CONNECTIONS = Gauge("chat_connections", "Open chat websocket connections.")
+CACHE_REQUESTS = Counter(
+    "chat_cache_requests_total",
+    "Response cache lookups by result; bypass means the message needed context.",
+    ["result"],
+)
+CACHE_ENTRIES = Gauge("chat_cache_entries", "Replies held in the response cache.")
+HISTORY_TOKENS = Gauge(
+    "chat_history_tokens",
+    "Estimated tokens of history and summary resent with each message.",
+    ["connection"],
+)
+HISTORY_BYTES = Gauge(
+    "chat_history_bytes", "Text held in chat history per connection.", ["connection"]
+)
+HISTORY_COMPACTIONS = Counter(
+    "chat_history_compactions_total", "Times a chat history was compacted."
+)
+UPSTREAM_WAIT_SECONDS = Histogram(
+    "chat_upstream_wait_seconds", "Time chat messages waited for an LLM call slot."
+)
+UPSTREAM_CALLS = Gauge(
+    "chat_upstream_calls", "LLM calls by state, in flight or waiting.", ["state"]
+)
+BUSY = Counter(
+    "chat_busy_total",
+    "Messages answered with a busy reply, by reason.",
+    ["reason"],
+)
+INTENTS = Counter(
+    "chat_intents_total",
+    "Messages by classified intent and whether they were answered locally.",
+    ["intent", "answered"],
+)
+SESSIONS = Gauge(
+    "chat_sessions", "Open chat sessions, resident in memory or offloaded.", ["state"]
+)
+SESSION_OFFLOADS = Counter(
+    "chat_session_offloads_total", "Idle chat sessions moved out of memory."
+)
+SESSION_RESTORES = Counter(
+    "chat_session_restores_total", "Chat sessions loaded back from the store."
+)
@@ -0,0 +1,199 @@
+import abc
+import asyncio
+import enum
+import json
+import random
+import threading
+import types as pytypes
+import typing
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from google import genai
+from google.genai import chats, types
+from pydantic import BaseModel
+
+
+class LLMProvider(abc.ABC):
+    """
+    What chat needs from an LLM backend: async generation, streaming, and
+    chat sessions. Responses are ``GenerateContentResponse`` objects
+    whatever the backend, so callers only read ``.text``.
+    """
+
+    @abc.abstractmethod
+    async def agenerate_content(self, *, model, contents, config=None):
+        pass
+
+    @abc.abstractmethod
+    async def agenerate_content_stream(self, *, model, contents, config=None):
+        pass
+
+    def create_chat(self, *, model, config=None, history=None):
+        return chats.AsyncChat(
+            modules=ChatModules(self), model=model, config=config, history=history or []
+        )
+
+
+class ChatModules:
+    """
+    Adapts a provider to the interface ``chats.AsyncChat`` calls into, so
+    every provider gets the SDK's history handling.
+    """
+
+    _api_client = None
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    async def generate_content(self, *, model, contents, config=None):
+        return await self.provider.agenerate_content(
+            model=model, contents=contents, config=config
+        )
+
+    async def generate_content_stream(self, *, model, contents, config=None):
+        return await self.provider.agenerate_content_stream(
+            model=model, contents=contents, config=config
+        )
+
+
+class GeminiProvider(LLMProvider):
+    def __init__(self, api_key):
+        self.client = genai.Client(api_key=api_key)
+
+    async def agenerate_content(self, *, model, contents, config=None):
+        return await self.client.aio.models.generate_content(
+            model=model, contents=contents, config=config
+        )
+
+    async def agenerate_content_stream(self, *, model, contents, config=None):
+        return await self.client.aio.models.generate_content_stream(
+            model=model, contents=contents, config=config
+        )
+
+    def create_chat(self, *, model, config=None, history=None):
+        return self.client.aio.chats.create(model=model, config=config, history=history)
+
+
+class StubProviderError(Exception):
+    pass
+
+
+def canned_value(annotation, name):
+    """
+    Fixed value of type ``annotation`` for the field ``name``.
+    """
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Literal:
+        return args[0]
+    if origin in (typing.Union, pytypes.UnionType):
+        return canned_value(next(arg for arg in args if arg is not type(None)), name)
+    if origin is list:
+        return [canned_value(args[0], f"{name} {index}") for index in (1, 2)]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return canned_output(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return list(annotation)[0].value
+    if annotation is bool:
+        return True
+    if annotation is int:
+        return 90
+    if annotation is float:
+        return 0.9
+    return f"Stub {name}."
+
+
+def canned_output(schema):
+    """
+    Schema-valid instance of the pydantic ``schema`` as a dict.
+    """
+    value = {
+        name: canned_value(field.annotation, name)
+        for name, field in schema.model_fields.items()
+    }
+    return schema.model_validate(value).model_dump(mode="json")
+
+
+class StubProvider(LLMProvider):
+    """
+    Offline provider for load tests and benchmarks. Answers with canned
+    output that is valid for the request's ``response_schema`` after
+    ``latency_ms``, fails ``failure_rate`` of calls with StubProviderError
+    and streams replies in ``chunks`` pieces. Failures follow ``seed`` so
+    runs are repeatable.
+    """
+
+    def __init__(self, latency_ms=200, failure_rate=0.0, chunks=4, seed=0):
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.chunks = max(chunks, 1)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def reply_text(self, config):
+        with self.lock:
+            failed = self.random.random() < self.failure_rate
+        if failed:
+            raise StubProviderError("Stub provider failure.")
+
+        schema = getattr(config, "response_schema", None)
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            return json.dumps(canned_output(schema))
+        return "Stub response."
+
+    def response(self, text):
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    content=types.ModelContent(parts=[types.Part.from_text(text=text)]),
+                    finish_reason=types.FinishReason.STOP,
+                )
+            ]
+        )
+
+    async def agenerate_content(self, *, model, contents, config=None):
+        await asyncio.sleep(self.latency)
+        return self.response(self.reply_text(config))
+
+    async def agenerate_content_stream(self, *, model, contents, config=None):
+        text = self.reply_text(config)
+        size = -(-len(text) // self.chunks)
+
+        async def stream():
+            # Half the latency before the first chunk, the rest spread over
+            # the remaining ones.
+            await asyncio.sleep(self.latency / 2)
+            for index, start in enumerate(range(0, len(text), size)):
+                if index:
+                    await asyncio.sleep(self.latency / 2 / (self.chunks - 1))
+                yield self.response(text[start : start + size])
+
+        return stream()
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    Provider selected by LLM_PROVIDER: "gemini", or "stub" to run without
+    the Gemini API.
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            if settings.LLM_PROVIDER not in ("gemini", "stub"):
+                raise ImproperlyConfigured(
+                    f"LLM_PROVIDER must be gemini or stub, got {settings.LLM_PROVIDER!r}."
+                )
+            if settings.LLM_PROVIDER == "stub":
+                _provider = StubProvider(
+                    latency_ms=settings.LLM_STUB_LATENCY_MS,
+                    failure_rate=settings.LLM_STUB_FAILURE_RATE,
+                    chunks=settings.LLM_STUB_CHUNKS,
+                    seed=settings.LLM_STUB_SEED,
+                )
+            else:
+                _provider = GeminiProvider(settings.GEMINI_API_KEY)
+    return _provider
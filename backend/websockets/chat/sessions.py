@@ -0,0 +1,118 @@
+import asyncio
+import json
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from google.genai import types
+from . import metrics
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+class SessionStore:
+    """
+    SQLite table of chat sessions that are not in memory: the summary and
+    curated history of sessions offloaded while idle, and of resumable
+    sessions whose socket closed. Sessions untouched for ``ttl`` seconds
+    are deleted.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = str(path)
+        self.ttl = ttl
+        with self.connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, summary TEXT, history TEXT, updated_at REAL)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+            )
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def save(self, session_id, summary, history):
+        data = json.dumps(
+            [content.model_dump(mode="json", exclude_none=True) for content in history],
+            separators=(",", ":"),
+        )
+        now = time.time()
+        with self.connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+                (session_id, summary, data, now),
+            )
+            db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+
+    def load(self, session_id):
+        """
+        Returns ``(summary, history)``, or None for unknown or expired
+        sessions.
+        """
+        with self.connect() as db:
+            row = db.execute(
+                "SELECT summary, history FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        summary, data = row
+        return summary, [
+            types.Content.model_validate(item) for item in json.loads(data)
+        ]
+
+    def delete(self, session_id):
+        with self.connect() as db:
+            db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+class SessionManager:
+    """
+    Keeps at most ``max_resident`` chat sessions in memory. Touching a
+    session makes it the most recent; the least recently active idle ones
+    beyond the limit are offloaded to the store. Sessions that are
+    answering, or fail to save, stay resident and are tried again on a
+    later touch.
+    """
+
+    def __init__(self, store, max_resident):
+        self.store = store
+        self.max_resident = max_resident
+        self.resident = OrderedDict()
+
+    async def touch(self, consumer):
+        self.resident[consumer] = None
+        self.resident.move_to_end(consumer)
+
+        for other in list(self.resident):
+            if len(self.resident) <= self.max_resident:
+                break
+            # Checked for each session in turn: while this touch awaits an
+            # offload, others can start answering, or be offloaded or
+            # closed by another touch.
+            if other is consumer or other.answering or other not in self.resident:
+                continue
+            del self.resident[other]
+            if await other.offload():
+                metrics.SESSION_OFFLOADS.inc()
+            elif not other.closed:
+                self.resident[other] = None
+                if not other.answering:
+                    self.resident.move_to_end(other, last=False)
+
+    def discard(self, consumer):
+        self.resident.pop(consumer, None)
+
+    async def save(self, session_id, summary, history):
+        await asyncio.to_thread(self.store.save, session_id, summary, history)
+
+    async def load(self, session_id):
+        state = await asyncio.to_thread(self.store.load, session_id)
+        if state is not None:
+            metrics.SESSION_RESTORES.inc()
+        return state
+
+    async def delete(self, session_id):
+        await asyncio.to_thread(self.store.delete, session_id)
@@ -0,0 +1,38 @@
+import json
+import re
+
+MESSAGE_START = re.compile(r'"message"\s*:\s*"')
+# A trailing backslash or \u escape that the next chunk will complete.
+INCOMPLETE_ESCAPE = re.compile(r"(?<!\\)(\\\\)*\\(u[0-9a-fA-F]{0,3})?$")
+
+
+class MessageStream:
+    """
+    Follows the JSON text of a BotResponse as it streams in and returns the
+    newly readable part of its ``message`` field after each chunk, so the
+    client can show the reply before the JSON object is complete.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.sent = 0
+
+    def feed(self, chunk):
+        self.text += chunk
+        start = MESSAGE_START.search(self.text)
+        if start is None:
+            return ""
+
+        raw = self.text[start.end() :]
+        end = re.search(r'(?<!\\)(\\\\)*"', raw)
+        if end is not None:
+            raw = raw[: end.end() - 1]
+        else:
+            incomplete = INCOMPLETE_ESCAPE.search(raw)
+            if incomplete is not None:
+                raw = raw[: incomplete.start() + len(incomplete.group(1) or "")]
+
+        message = json.loads(f'"{raw}"')
+        delta = message[self.sent :]
+        self.sent = len(message)
+        return delta
@@ -1,3 +1,345 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+from google.genai import types
 
-# Create your tests here.
+from . import consumers
+from .cache import ResponseCache, is_context_free, normalize
+from .consumers import ChatConsumer
+from .history import HistoryPolicy, merge_contents, split_turns
+from .streaming import MessageStream
+from .intents import IN_SCOPE, OUT_OF_SCOPE, REFUSAL, classifier, local_answer
+from .limiter import UpstreamBusy, UpstreamLimiter
+from .providers import StubProvider
+from .sessions import SessionManager, SessionStore
+
+THRESHOLD = 0.65
+
+
+class LocalAnswerTests(SimpleTestCase):
+    def test_greetings_are_answered_locally(self):
+        intent, answer = local_answer("Hello there!", THRESHOLD)
+        self.assertEqual(answer["type"], "greeting")
+        self.assertEqual(answer["message"], "Hello! How can I assist you today?")
+
+    def test_in_scope_questions_fall_back_to_the_model(self):
+        for text in [
+            "What is your opinion on drip irrigation?",
+            "recommend a good seed variety",
+            "What do you think about using urea for wheat?",
+            "What is the capital requirement for a farm?",
+            "which model of tractor should i buy",
+            "how do i add an item",
+            "who made this app",
+        ]:
+            with self.subTest(text=text):
+                self.assertIsNone(local_answer(text, THRESHOLD)[1])
+
+    def test_out_of_scope_questions_are_refused(self):
+        for text in [
+            "tell me a joke",
+            "what's the weather like today",
+            "what model are you",
+            "what is the capital of france",
+            "recommend a good movie",
+            "What is your opinion on politics?",
+        ]:
+            with self.subTest(text=text):
+                intent, answer = local_answer(text, THRESHOLD)
+                self.assertEqual(intent, OUT_OF_SCOPE)
+                self.assertEqual(answer, {"type": "response", "message": REFUSAL})
+
+    def test_threshold_above_one_disables_refusals(self):
+        self.assertIsNone(local_answer("tell me a joke", 1.01)[1])
+
+
+class IntentClassifierTests(SimpleTestCase):
+    def test_stopwords_do_not_decide_the_match(self):
+        scores = classifier.scores("what is your opinion on drip irrigation")
+        self.assertLess(scores[OUT_OF_SCOPE], THRESHOLD)
+
+    def test_messages_without_known_terms_score_zero(self):
+        self.assertEqual(classifier.classify("tomato blight"), (IN_SCOPE, 0.0))
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def test_normalize_drops_case_punctuation_and_spacing(self):
+        self.assertEqual(normalize("  How do I ADD an item?! "), "how do i add an item")
+
+    def test_messages_referring_back_are_not_context_free(self):
+        self.assertTrue(is_context_free(normalize("How do I add an item?")))
+        self.assertFalse(is_context_free(normalize("How do I delete it?")))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(
+            cache.stats(), {"size": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+        )
+
+    def test_entries_expire_after_ttl(self):
+        cache = ResponseCache(maxsize=2, ttl=60)
+        with mock.patch("chat.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+        with mock.patch("chat.cache.time.monotonic", return_value=161):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_zero_size_disables_the_cache(self):
+        cache = ResponseCache(maxsize=0, ttl=60)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+
+class MessageStreamTests(SimpleTestCase):
+    def feed_all(self, chunks):
+        stream = MessageStream()
+        return [stream.feed(chunk) for chunk in chunks]
+
+    def test_message_is_returned_as_it_arrives(self):
+        deltas = self.feed_all(
+            ['{"type": "response", "mes', 'sage": "Add ', "an item", '", "steps": []}']
+        )
+        self.assertEqual(deltas, ["", "Add ", "an item", ""])
+
+    def test_escapes_split_across_chunks(self):
+        deltas = self.feed_all(['{"message": "a \\', "n b \\u00", 'e9 \\"q\\""}'])
+        self.assertEqual("".join(deltas), 'a \n b \u00e9 "q"')
+
+    def test_unicode_escape_waits_for_all_digits(self):
+        deltas = self.feed_all(['{"message": "caf\\u00', 'e9"}'])
+        self.assertEqual(deltas, ["caf", "\u00e9"])
+
+
+def content(role, text):
+    return types.Content(role=role, parts=[types.Part.from_text(text=text)])
+
+
+def conversation(turns, size=4):
+    history = []
+    for turn in range(turns):
+        history.append(content("user", f"q{turn}".ljust(size)))
+        history.append(content("model", f"a{turn}".ljust(size)))
+    return history
+
+
+class HistoryPolicyTests(SimpleTestCase):
+    def test_history_within_bounds_is_kept(self):
+        history = conversation(4)
+        self.assertEqual(HistoryPolicy(4, 1000).split(history), ([], history))
+
+    def test_too_many_turns_keeps_the_newest_half(self):
+        history = conversation(5)
+        older, recent = HistoryPolicy(4, 1000).split(history)
+        self.assertEqual(older, history[:6])
+        self.assertEqual(recent, history[6:])
+
+    def test_over_budget_drops_turns_until_it_fits(self):
+        history = conversation(4, size=40)
+        older, recent = HistoryPolicy(10, 25).split(history)
+        self.assertEqual(recent, history[6:])
+        self.assertEqual(older + recent, history)
+
+    def test_newest_turn_is_kept_even_over_budget(self):
+        history = conversation(2, size=400)
+        older, recent = HistoryPolicy(10, 10).split(history)
+        self.assertEqual(recent, history[2:])
+
+    def test_streamed_chunks_stay_in_their_turn(self):
+        history = [
+            content("user", "q0"),
+            content("model", "a"),
+            content("model", "b"),
+            content("user", "q1"),
+        ]
+        self.assertEqual([len(turn) for turn in split_turns(history)], [3, 1])
+        merged = merge_contents(history)
+        self.assertEqual([c.parts[0].text for c in merged], ["q0", "ab", "q1"])
+
+
+class FakeSession:
+    def __init__(self, saved=True):
+        self.answering = False
+        self.closed = False
+        self.saved = saved
+        self.offloaded = False
+
+    async def offload(self):
+        self.offloaded = self.saved
+        return self.saved
+
+
+class SessionManagerTests(SimpleTestCase):
+    def setUp(self):
+        self.manager = SessionManager(store=None, max_resident=2)
+
+    async def test_least_recently_touched_idle_session_is_offloaded(self):
+        a, b, c = FakeSession(), FakeSession(), FakeSession()
+        for session in (a, b, a, c):
+            await self.manager.touch(session)
+        self.assertEqual((a.offloaded, b.offloaded, c.offloaded), (False, True, False))
+        self.assertEqual(list(self.manager.resident), [a, c])
+
+    async def test_answering_sessions_stay_resident(self):
+        a, b, c = FakeSession(), FakeSession(), FakeSession()
+        await self.manager.touch(a)
+        await self.manager.touch(b)
+        a.answering = True
+        await self.manager.touch(c)
+        self.assertEqual((a.offloaded, b.offloaded), (False, True))
+
+    async def test_sessions_that_fail_to_save_stay_resident(self):
+        a, b, c = FakeSession(saved=False), FakeSession(), FakeSession()
+        for session in (a, b, c):
+            await self.manager.touch(session)
+        self.assertEqual(list(self.manager.resident), [a, c])
+        self.assertTrue(b.offloaded)
+
+
+@override_settings(CHAT_LOCAL_INTENTS=False, CHAT_STREAMING=False)
+class ChatSessionOffloadTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store = SessionStore(Path(directory.name) / "sessions.sqlite3", ttl=60)
+        save = store.save
+
+        def slow_save(*args):
+            time.sleep(0.1)
+            save(*args)
+
+        store.save = slow_save
+        provider = StubProvider(latency_ms=300)
+        for patcher in (
+            mock.patch.object(consumers, "sessions", SessionManager(store, 1)),
+            mock.patch.object(consumers, "get_provider", return_value=provider),
+            mock.patch.object(consumers, "response_cache", ResponseCache(0, 0)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+        await communicator.connect()
+        return communicator
+
+    async def ask(self, communicator, text):
+        await communicator.send_to(text_data=text)
+        return json.loads(await communicator.receive_from(5))
+
+    async def test_session_answering_during_an_offload_is_not_offloaded(self):
+        a, b, c = await self.connect(), await self.connect(), await self.connect()
+        try:
+            # a is answering when b arrives, so both stay resident.
+            replies = await asyncio.gather(
+                self.ask(a, "first question"), self.ask(b, "first question")
+            )
+            self.assertNotIn("error", [reply["type"] for reply in replies])
+
+            # c offloads a, then b while b answers a question asked meanwhile.
+            asking_c = asyncio.ensure_future(self.ask(c, "first question"))
+            await asyncio.sleep(0.05)
+            self.assertNotEqual((await self.ask(b, "second question"))["type"], "error")
+            self.assertNotEqual((await asking_c)["type"], "error")
+            self.assertTrue(await b.receive_nothing(0.5))
+            _, consumer_b, _ = sorted(
+                consumers.open_consumers, key=lambda consumer: consumer.connection_id
+            )
+            self.assertEqual(len(consumer_b.chat.get_history(curated=True)), 4)
+
+            self.assertNotEqual((await self.ask(b, "third question"))["type"], "error")
+            self.assertTrue(await b.receive_nothing(0.5))
+        finally:
+            for communicator in (a, b, c):
+                await communicator.disconnect()
+
+
+@override_settings(CHAT_LOCAL_INTENTS=False, CHAT_STREAMING=False)
+class ChatReplyFailureTests(SimpleTestCase):
+    async def test_provider_failure_is_logged_and_answered_with_an_error(self):
+        provider = StubProvider(latency_ms=0, failure_rate=1.0)
+        with mock.patch.object(
+            consumers, "get_provider", return_value=provider
+        ), mock.patch.object(consumers, "response_cache", ResponseCache(0, 0)):
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            try:
+                with self.assertLogs("chat.consumers", "ERROR") as logs:
+                    await communicator.send_to(text_data="first question")
+                    reply = json.loads(await communicator.receive_from(5))
+            finally:
+                await communicator.disconnect()
+        self.assertEqual(reply["type"], "error")
+        self.assertIn("StubProviderError", logs.output[0])
+
+
+class UpstreamLimiterTests(SimpleTestCase):
+    async def hold(self, limiter, release):
+        async with limiter.slot():
+            await release.wait()
+
+    async def occupy(self, limiter, release, count=1):
+        tasks = [
+            asyncio.ensure_future(self.hold(limiter, release)) for _ in range(count)
+        ]
+        # One call holds the only slot and the rest wait for it.
+        while (limiter.in_flight, limiter.waiting) != (1, count - 1):
+            await asyncio.sleep(0.01)
+        return tasks
+
+    async def test_callers_beyond_the_waiting_limit_are_turned_away(self):
+        limiter = UpstreamLimiter(1, 1, 5)
+        release = asyncio.Event()
+        tasks = await self.occupy(limiter, release, count=2)
+        try:
+            with self.assertRaisesMessage(
+                UpstreamBusy, "Too many requests are waiting."
+            ):
+                async with limiter.slot():
+                    pass
+        finally:
+            release.set()
+            await asyncio.gather(*tasks)
+        self.assertEqual((limiter.in_flight, limiter.waiting), (0, 0))
+
+    async def test_waiting_callers_time_out(self):
+        limiter = UpstreamLimiter(1, 1, 0.01)
+        release = asyncio.Event()
+        tasks = await self.occupy(limiter, release)
+        try:
+            with self.assertRaisesMessage(UpstreamBusy, "Timed out"):
+                async with limiter.slot():
+                    pass
+            self.assertEqual(limiter.waiting, 0)
+        finally:
+            release.set()
+            await asyncio.gather(*tasks)
+
+    @override_settings(CHAT_LOCAL_INTENTS=False, CHAT_STREAMING=False)
+    async def test_sockets_are_told_when_the_assistant_is_busy(self):
+        limiter = UpstreamLimiter(1, 0, 5)
+        release = asyncio.Event()
+        tasks = await self.occupy(limiter, release)
+        with mock.patch.object(consumers, "upstream", limiter), mock.patch.object(
+            consumers, "get_provider", return_value=StubProvider(latency_ms=0)
+        ), mock.patch.object(consumers, "response_cache", ResponseCache(0, 0)):
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            await communicator.connect()
+            try:
+                await communicator.send_to(text_data="first question")
+                reply = json.loads(await communicator.receive_from(5))
+            finally:
+                await communicator.disconnect()
+                release.set()
+                await asyncio.gather(*tasks)
+        self.assertEqual(reply["type"], "busy")
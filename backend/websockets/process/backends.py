@@ -0,0 +1,100 @@
+import logging
+import time
+import numpy as np
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from ultralytics import YOLO
+
+logger = logging.getLogger(__name__)
+
+# Inference runtimes and the suffix ultralytics gives their exported models.
+BACKENDS = {
+    "pytorch": ".pt",
+    "torchscript": ".torchscript",
+    "onnx": ".onnx",
+    "openvino": "_openvino_model",
+}
+
+
+def default_model_path(backend, source=None):
+    """
+    Path ultralytics exports ``source`` to for ``backend``, e.g.
+    ``yolov8n.pt`` -> ``yolov8n.onnx``.
+    """
+    source = Path(source or settings.VISION_SOURCE_MODEL)
+    if backend == "pytorch":
+        return str(source)
+    return str(source.with_suffix("")) + BACKENDS[backend]
+
+
+def backend_for_path(path):
+    name = Path(path).name.rstrip("/")
+    for backend, suffix in BACKENDS.items():
+        if name.endswith(suffix):
+            return backend
+    return None
+
+
+def model_path():
+    backend = settings.VISION_BACKEND
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(
+            f"VISION_BACKEND must be one of {', '.join(BACKENDS)}, got {backend!r}."
+        )
+
+    path = settings.VISION_MODEL_PATH or default_model_path(backend)
+    if backend_for_path(path) != backend:
+        raise ImproperlyConfigured(
+            f"VISION_MODEL_PATH {path!r} is not a {backend} model."
+        )
+    return path
+
+
+def warmup(model, runs, imgsz):
+    image = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    for _ in range(runs):
+        model(image, imgsz=imgsz, verbose=False)
+
+
+def load_model(path=None):
+    """
+    Loads the configured model and runs it on blank frames so the first
+    client frame does not pay for graph setup.
+    """
+    model = YOLO(path or model_path(), task="detect")
+    warmup(model, settings.VISION_WARMUP_RUNS, settings.VISION_IMGSZ)
+    return model
+
+
+def measure_latency(model, runs, imgsz):
+    image = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    started = time.perf_counter()
+    for _ in range(runs):
+        model(image, imgsz=imgsz, verbose=False)
+    return (time.perf_counter() - started) * 1000 / runs
+
+
+def benchmark_backends(runs=20):
+    """
+    Times every backend whose model is present on this host and logs the
+    per-frame latency of each, fastest first.
+    """
+    imgsz = settings.VISION_IMGSZ
+    latencies = {}
+    for backend in BACKENDS:
+        path = default_model_path(backend)
+        if not Path(path).exists():
+            continue
+        try:
+            model = YOLO(path, task="detect")
+            warmup(model, settings.VISION_WARMUP_RUNS, imgsz)
+            latencies[backend] = measure_latency(model, runs, imgsz)
+        except Exception as e:
+            logger.warning("Could not benchmark %s backend: %s", backend, e)
+
+    for backend, latency in sorted(latencies.items(), key=lambda item: item[1]):
+        logger.info(
+            "Vision backend %s: %.1f ms/frame at imgsz %d", backend, latency, imgsz
+        )
+    return latencies
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from django.conf import settings
+from .inference import get_executor, InferenceQueueFull
+
+
+class BatchScheduler:
+    """
+    Gathers frames from every connected socket for up to ``max_wait_ms``
+    (or until ``max_batch_size`` frames are waiting) and runs them through
+    the model as a single batched call.
+    """
+
+    def __init__(self, executor, batch_func, max_batch_size, max_wait_ms):
+        self.executor = executor
+        self.batch_func = batch_func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pending = []
+        self.flush_handle = None
+        self.batches = 0
+        self.batched_frames = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((item, future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.max_wait, self.flush)
+
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        batch = [(item, future) for item, future in self.pending if not future.done()]
+        self.pending = []
+        if not batch:
+            return
+
+        try:
+            inference = self.executor.submit(
+                self.batch_func, [item for item, _ in batch]
+            )
+        except InferenceQueueFull as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.batched_frames += len(batch)
+        inference.add_done_callback(lambda done: self.distribute(batch, done))
+
+    def distribute(self, batch, done):
+        error = done.exception()
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            result = error if error is not None else done.result()[index]
+            # Batch functions return an exception for an item that failed
+            # on its own.
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "pending": len(self.pending),
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_frames / max(self.batches, 1), 2),
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(batch_func):
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BatchScheduler(
+                get_executor(),
+                batch_func,
+                settings.VISION_BATCH_MAX_SIZE,
+                settings.VISION_BATCH_MAX_WAIT_MS,
+            )
+    return _scheduler
@@ -0,0 +1,91 @@
+import io
+import threading
+import cv2
+import numpy as np
+from PIL import Image
+
+# Decoder-side downscaling factors supported by the JPEG decoder.
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+class BufferPool(threading.local):
+    """
+    Per-thread frame buffers reused across frames of the same shape. Each
+    position in a batch gets its own buffer since results reference them
+    until the batch has been rendered.
+    """
+
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, slot, shape):
+        buffer = self.buffers.get(slot)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self.buffers[slot] = buffer
+        return buffer
+
+
+buffers = BufferPool()
+
+
+def decode(bytes_data, imgsz=None, slot=0):
+    """
+    Decodes a frame straight to the BGR array the model expects. When
+    ``imgsz`` is smaller than the frame, JPEGs are decoded at a reduced
+    scale and other formats are resized into a reusable buffer, keeping
+    the longest side at least ``imgsz``. Returns None for data that does
+    not decode.
+    """
+    if not imgsz:
+        return cv2.imdecode(np.frombuffer(bytes_data, np.uint8), cv2.IMREAD_COLOR)
+
+    try:
+        header = Image.open(io.BytesIO(bytes_data))
+    except OSError:
+        # Not an image, e.g. UnidentifiedImageError. Reported like frames
+        # OpenCV cannot decode.
+        return None
+    width, height = header.size
+    longest = max(width, height)
+
+    if header.format == "JPEG":
+        for factor, flag in REDUCED_FLAGS:
+            if longest // factor >= imgsz:
+                return cv2.imdecode(np.frombuffer(bytes_data, np.uint8), flag)
+
+    image = cv2.imdecode(np.frombuffer(bytes_data, np.uint8), cv2.IMREAD_COLOR)
+    if longest <= imgsz:
+        return image
+
+    scale = imgsz / longest
+    size = (round(width * scale), round(height * scale))
+    buffer = buffers.get(slot, (size[1], size[0], 3))
+    return cv2.resize(image, size, dst=buffer, interpolation=cv2.INTER_AREA)
+
+
+def encode_jpeg(image, quality):
+    _, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+
+def encode_webp(image, quality):
+    _, encoded = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    return encoded.tobytes()
+
+
+ENCODERS = {
+    "jpeg": encode_jpeg,
+    "webp": encode_webp,
+}
+
+
+def encode(image, codec, quality):
+    """
+    Encodes a BGR array with one of the registered ENCODERS.
+    """
+    return ENCODERS[codec](image, quality)
@@ -1,9 +1,20 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
-from ultralytics import YOLO
-from PIL import Image
-import io
+from django.conf import settings
+from django.http import parse_cookie
+from .inference import InferenceQueueFull
+from . import metrics
+from .batching import get_scheduler
+from .frames import LatestFrameSlot
+from .motion import MotionState
+from .params import SCENE_KEYS, default_options, parse_options, parse_stock_labels
+from .pipeline import FrameError, process_frames
+from .stock import StockAggregator, push_updates
+import asyncio
+import json
+import logging
+import time
 
-model = YOLO("yolov8n.pt")
+logger = logging.getLogger(__name__)
 
 
 class WebSocketConsumer(AsyncWebsocketConsumer):
@@ -11,26 +22,145 @@ class WebSocketConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
         print("WebSocket connection established")
+        metrics.CONNECTIONS.inc()
+        self.options = default_options()
+        self.motion = self.create_motion_state()
+        self.frame_id = 0
+        self.slot = LatestFrameSlot()
+
+        headers = dict(self.scope["headers"])
+        cookies = parse_cookie(headers.get(b"cookie", b"").decode("latin-1"))
+        self.access_token = cookies.get("access")
+        self.set_stock_labels(settings.VISION_STOCK_LABELS)
+        self.stock_sync = asyncio.create_task(self.sync_stock())
+        self.worker = asyncio.create_task(self.run())
 
     async def disconnect(self, code):
         print(f"WebSocket connection closed. Code: {code}")
+        metrics.CONNECTIONS.dec()
+        self.worker.cancel()
+        self.stock_sync.cancel()
+        await self.flush_stock()
 
     async def receive(self, text_data=None, bytes_data=None):
-        print(
-            f"Recieved data. Size: {len(text_data) if text_data else len(bytes_data)} bytes"
+        logger.debug(
+            "Received data. Size: %d bytes",
+            len(text_data) if text_data else len(bytes_data),
         )
 
-        if bytes_data:
+        if text_data:
+            await self.configure(text_data)
+        elif bytes_data:
+            self.frame_id += 1
+            if self.slot.frame is not None:
+                metrics.FRAMES.inc(outcome="dropped")
+            self.slot.put((self.frame_id, bytes_data, dict(self.options), self.motion))
+
+    async def configure(self, text_data):
+        """
+        Applies a client configuration message such as
+        ``{"mode": "json", "imgsz": 320, "classes": ["bottle"]}``.
+        See params.parse_options for the supported keys.
+        """
+        try:
+            config = json.loads(text_data)
+            options = parse_options(config, self.options)
+            stock_labels = parse_stock_labels(config.get("stock", self.stock_labels))
+        except ValueError as e:
+            await self.send(json.dumps({"error": str(e)}))
+            return
+
+        if any(options[key] != self.options[key] for key in SCENE_KEYS):
+            self.motion = self.create_motion_state()
+        self.options = options
+        if stock_labels != self.stock_labels:
+            await self.flush_stock()
+            self.set_stock_labels(stock_labels)
+
+        await self.send(
+            json.dumps(
+                {
+                    "config": {
+                        **self.options,
+                        "stock": self.stock_labels,
+                        "stock_sync": self.stock is not None,
+                    }
+                }
+            )
+        )
+
+    def create_motion_state(self):
+        return MotionState(
+            settings.VISION_MOTION_THRESHOLD, settings.VISION_KEYFRAME_INTERVAL
+        )
+
+    def set_stock_labels(self, labels):
+        """
+        Maps detected labels to the user's product slugs. Stock sync needs a
+        mapping and the user's access cookie.
+        """
+        self.stock_labels = labels
+        self.stock = None
+        if labels and self.access_token:
+            self.stock = StockAggregator(
+                labels, settings.VISION_STOCK_WINDOW, settings.VISION_STOCK_DEBOUNCE
+            )
+
+    async def sync_stock(self):
+        while True:
+            await asyncio.sleep(settings.VISION_STOCK_FLUSH_INTERVAL)
+            await self.flush_stock()
 
-            image = Image.open(io.BytesIO(bytes_data))
+    async def flush_stock(self):
+        if self.stock is None:
+            return
+        updates = self.stock.collect()
+        if updates and not await push_updates(updates, self.access_token):
+            self.stock.restore(updates)
 
-            results = model(image)
+    async def run(self):
+        while True:
+            frame, received_at = await self.slot.get()
 
-            processed_bytes = results[0].plot()
+            try:
+                reply, timings, counts = await get_scheduler(process_frames).submit(
+                    frame
+                )
+            except InferenceQueueFull as e:
+                metrics.FRAMES.inc(outcome="rejected")
+                await self.send(json.dumps({"error": str(e)}))
+                continue
+            except FrameError as e:
+                # The client sent something that is not an image.
+                metrics.FRAMES.inc(outcome="invalid")
+                await self.send(json.dumps({"error": str(e)}))
+                continue
+            except Exception:
+                metrics.FRAMES.inc(outcome="failed")
+                logger.exception("Frame processing failed")
+                await self.send(json.dumps({"error": "Frame processing failed."}))
+                continue
 
-            processed_image = Image.fromarray(processed_bytes)
+            if self.stock is not None:
+                self.stock.add(counts, time.monotonic())
 
-            BufferedImage = io.BytesIO()
-            processed_image.save(BufferedImage, format="WEBP")
+            started = time.perf_counter()
+            if isinstance(reply, str):
+                await self.send(text_data=reply)
+            else:
+                await self.send(bytes_data=reply)
+            timings["send"] = round((time.perf_counter() - started) * 1000, 2)
+            lag = time.monotonic() - received_at
+            metrics.observe_timings(timings)
+            metrics.FRAME_LAG_SECONDS.observe(lag)
+            metrics.FRAMES.inc(outcome="processed")
 
-        await self.send(bytes_data=BufferedImage.getvalue())
+            status = {
+                "frame_id": frame[0],
+                "dropped": self.slot.dropped,
+                "lag_ms": round(lag * 1000),
+                "timings_ms": timings,
+            }
+            if self.options["motion"]:
+                status["motion"] = self.motion.stats()
+            await self.send(json.dumps({"status": status}))
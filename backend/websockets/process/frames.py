@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+
+class LatestFrameSlot:
+    """
+    Holds at most one pending frame per connection. A newer frame replaces
+    the one still waiting, so inference always works on the freshest image.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.received_at = None
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def put(self, frame):
+        if self.frame is not None:
+            self.dropped += 1
+        self.frame = frame
+        self.received_at = time.monotonic()
+        self.ready.set()
+
+    async def get(self):
+        await self.ready.wait()
+        self.ready.clear()
+        frame, received_at = self.frame, self.received_at
+        self.frame = None
+        return frame, received_at
@@ -0,0 +1,131 @@
+import asyncio
+import queue
+import threading
+import time
+from django.conf import settings
+from .backends import benchmark_backends, load_model
+from .workers import RemoteModel
+
+
+class InferenceQueueFull(Exception):
+    pass
+
+
+def _resolve(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def create_model(index):
+    """
+    Model used by inference thread ``index``: loaded in-process, or a proxy
+    to a dedicated inference process when VISION_WORKER_MODE is "process".
+    """
+    if settings.VISION_WORKER_MODE == "process":
+        return RemoteModel(index, settings.VISION_INFERENCE_WORKERS)
+    return load_model()
+
+
+class InferenceWorker(threading.Thread):
+    """
+    Runs inference jobs on its own model instance, since ultralytics
+    predictors are not safe to share between threads.
+    """
+
+    def __init__(self, index, queue_size, model_factory):
+        super().__init__(name=f"inference-worker-{index}", daemon=True)
+        self.index = index
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.model_factory = model_factory
+        self.processed = 0
+        self.last_wait = 0.0
+        self.total_wait = 0.0
+        self.busy = False
+
+    def run(self):
+        # If the model cannot be loaded, fail jobs instead of leaving them
+        # waiting forever.
+        model, load_error = None, None
+        try:
+            model = self.model_factory(self.index)
+        except Exception as e:
+            load_error = e
+
+        while True:
+            func, args, loop, future, enqueued_at = self.jobs.get()
+            wait = time.perf_counter() - enqueued_at
+            self.last_wait = wait
+            self.total_wait += wait
+            self.busy = True
+            result, error = None, load_error
+            try:
+                if error is None:
+                    result = func(model, *args)
+            except Exception as e:
+                error = e
+            self.busy = False
+            self.processed += 1
+            loop.call_soon_threadsafe(_resolve, future, result, error)
+
+    def stats(self):
+        return {
+            "worker": self.index,
+            "queue_depth": self.jobs.qsize(),
+            "busy": self.busy,
+            "processed": self.processed,
+            "last_wait_ms": round(self.last_wait * 1000, 2),
+            "avg_wait_ms": round(self.total_wait * 1000 / max(self.processed, 1), 2),
+        }
+
+
+class InferenceExecutor:
+    """
+    Bounded pool of inference threads that async consumers can await
+    without blocking the event loop.
+    """
+
+    def __init__(self, workers, queue_size, model_factory=create_model):
+        self.workers = [
+            InferenceWorker(i, queue_size, model_factory) for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, func, *args):
+        """
+        Queues ``func(model, *args)`` on the least loaded worker and returns
+        an awaitable future. Raises InferenceQueueFull when every worker
+        queue is at capacity.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        worker = min(self.workers, key=lambda w: w.jobs.qsize() + w.busy)
+        try:
+            worker.jobs.put_nowait((func, args, loop, future, time.perf_counter()))
+        except queue.Full:
+            raise InferenceQueueFull("All inference workers are at capacity.")
+        return future
+
+    def stats(self):
+        return [worker.stats() for worker in self.workers]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if settings.VISION_STARTUP_BENCHMARK:
+                threading.Thread(target=benchmark_backends, daemon=True).start()
+            _executor = InferenceExecutor(
+                settings.VISION_INFERENCE_WORKERS,
+                settings.VISION_INFERENCE_QUEUE_SIZE,
+            )
+    return _executor
@@ -0,0 +1,459 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+import psutil
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ultralytics.utils import ASSETS
+from process.backends import BACKENDS
+
+
+def load_frames(source):
+    """
+    Recorded frames as JPEG bytes, read from a video file or from the
+    images in a directory (sorted by name). Defaults to the sample images
+    bundled with ultralytics.
+    """
+    path = Path(source or ASSETS)
+    if path.is_dir():
+        images = sorted(
+            image
+            for image in path.iterdir()
+            if image.suffix.lower() in (".jpg", ".jpeg", ".png")
+        )
+        frames = [cv2.imread(str(image)) for image in images]
+    else:
+        capture = cv2.VideoCapture(str(path))
+        frames = []
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+        capture.release()
+
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        raise CommandError(f"No frames could be read from {path}.")
+    return [cv2.imencode(".jpg", frame)[1].tobytes() for frame in frames]
+
+
+class CommunicatorConnection:
+    """
+    In-process connection to the ASGI application.
+    """
+
+    async def open(self, path):
+        from channels.testing import WebsocketCommunicator
+        from vision.asgi import application
+
+        self.communicator = WebsocketCommunicator(application, path)
+        connected, _ = await self.communicator.connect()
+        if not connected:
+            raise CommandError(f"Could not connect to {path}.")
+
+    async def send(self, data):
+        if isinstance(data, str):
+            await self.communicator.send_to(text_data=data)
+        else:
+            await self.communicator.send_to(bytes_data=data)
+
+    async def recv(self):
+        while True:
+            message = await self.communicator.receive_output(timeout=60)
+            if message["type"] == "websocket.close":
+                raise ConnectionError("Connection closed by the server.")
+            if message["type"] == "websocket.send":
+                return message.get("text") or message.get("bytes")
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class SocketConnection:
+    """
+    Real websocket connection to a running server.
+    """
+
+    def __init__(self, url):
+        self.url = url
+
+    async def open(self, path):
+        from websockets.asyncio.client import connect
+
+        self.socket = await connect(self.url.rstrip("/") + "/" + path, max_size=None)
+
+    async def send(self, data):
+        await self.socket.send(data)
+
+    async def recv(self):
+        return await self.socket.recv()
+
+    async def close(self):
+        await self.socket.close()
+
+
+class ResourceMonitor:
+    """
+    Samples the RSS and CPU time of the serving process and its children
+    (inference processes in VISION_WORKER_MODE=process).
+    """
+
+    def __init__(self, pid, interval=0.1):
+        try:
+            self.process = psutil.Process(pid)
+        except psutil.NoSuchProcess:
+            raise CommandError(f"No process with pid {pid}.")
+        self.interval = interval
+        self.peak_rss = 0
+
+    def processes(self):
+        return [self.process] + self.process.children(recursive=True)
+
+    def cpu_seconds(self):
+        total = 0.0
+        for process in self.processes():
+            try:
+                times = process.cpu_times()
+            except psutil.NoSuchProcess:
+                continue
+            total += times.user + times.system
+        return total
+
+    def sample(self):
+        rss = 0
+        for process in self.processes():
+            try:
+                rss += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+class BenchmarkClient:
+    """
+    Replays recorded frames over one ``ws/vision/`` connection and records
+    the latency of every answered frame.
+    """
+
+    def __init__(self, connection, frames, config, offset):
+        self.connection = connection
+        self.frames = frames
+        self.config = config
+        self.offset = offset
+        self.sent_at = {}
+        self.latencies = []
+        self.stats = {"sent": 0, "processed": 0, "dropped": 0, "errors": 0}
+        self.answered = asyncio.Event()
+        self.frame_ids = itertools.count(1)
+
+    async def start(self):
+        """
+        Connects, applies the configuration and waits for a first frame,
+        which loads the model and is left out of the results.
+        """
+        await self.connection.open("ws/vision/")
+        await self.connection.send(
+            json.dumps({key: self.config[key] for key in ("mode", "codec", "imgsz")})
+        )
+        reply = json.loads(await self.connection.recv())
+        if "error" in reply:
+            raise CommandError(f"Configuration rejected: {reply['error']}")
+
+        self.receiver = asyncio.create_task(self.receive())
+        await self.send_frame()
+        await self.answered.wait()
+        self.latencies.clear()
+        self.stats.update(sent=0, processed=0, errors=0)
+
+    async def send_frame(self):
+        frame_id = next(self.frame_ids)
+        self.sent_at[frame_id] = time.perf_counter()
+        self.stats["sent"] += 1
+        await self.connection.send(
+            self.frames[(self.offset + frame_id) % len(self.frames)]
+        )
+
+    async def receive(self):
+        while True:
+            message = await self.connection.recv()
+            if not isinstance(message, str):
+                continue
+            message = json.loads(message)
+            if "error" in message:
+                self.stats["errors"] += 1
+                self.answered.set()
+            elif "status" in message:
+                status = message["status"]
+                sent_at = self.sent_at.pop(status["frame_id"])
+                self.latencies.append((time.perf_counter() - sent_at) * 1000)
+                self.stats["processed"] += 1
+                self.stats["dropped"] = status["dropped"]
+                self.answered.set()
+
+    async def replay(self, duration, fps):
+        """
+        Sends frames for ``duration`` seconds, at ``fps`` frames per second
+        or, with ``fps`` 0, one frame per answer.
+        """
+        deadline = time.perf_counter() + duration
+        try:
+            while time.perf_counter() < deadline:
+                self.answered.clear()
+                await self.send_frame()
+                if fps:
+                    await asyncio.sleep(1 / fps)
+                else:
+                    await asyncio.wait_for(
+                        self.answered.wait(), deadline - time.perf_counter()
+                    )
+        except asyncio.TimeoutError:
+            pass
+        # Give in-flight frames a moment to come back before closing.
+        await asyncio.sleep(0.5)
+        self.receiver.cancel()
+        await self.connection.close()
+
+
+async def run_configuration(config, frames, options):
+    url = options["url"]
+    pid = options["pid"] or (None if url else os.getpid())
+    monitor = ResourceMonitor(pid) if pid else None
+
+    clients = [
+        BenchmarkClient(
+            SocketConnection(url) if url else CommunicatorConnection(),
+            frames,
+            config,
+            offset=index * 7,
+        )
+        for index in range(config["clients"])
+    ]
+    await asyncio.gather(*(client.start() for client in clients))
+
+    sampler = None
+    if monitor:
+        cpu_before = monitor.cpu_seconds()
+        sampler = asyncio.create_task(monitor.run())
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client.replay(options["duration"], options["fps"]) for client in clients)
+    )
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([value for client in clients for value in client.latencies])
+    totals = {
+        key: sum(client.stats[key] for client in clients)
+        for key in ("sent", "processed", "dropped", "errors")
+    }
+    result = {
+        "config": config,
+        **totals,
+        "throughput_fps": round(totals["processed"] / options["duration"], 2),
+        "latency_ms": {
+            name: (
+                round(float(np.percentile(latencies, q)), 2) if len(latencies) else None
+            )
+            for name, q in (("p50", 50), ("p90", 90), ("p99", 99))
+        },
+    }
+    if monitor:
+        sampler.cancel()
+        monitor.sample()
+        result["peak_rss_mb"] = round(monitor.peak_rss / 2**20, 1)
+        result["cpu_percent"] = round(
+            (monitor.cpu_seconds() - cpu_before) / elapsed * 100, 1
+        )
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def config_key(config):
+    return tuple(sorted(config.items()))
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays recorded frames into concurrent ws/vision/ connections and "
+        "reports throughput, latency percentiles, drops, peak RSS and CPU."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--frames", help="Video file or image directory to replay.")
+        parser.add_argument(
+            "--url",
+            help="Benchmark a running server, e.g. ws://localhost:8001, "
+            "instead of the application in-process.",
+        )
+        parser.add_argument(
+            "--pid", type=int, help="Server process to measure RSS and CPU of."
+        )
+        parser.add_argument("--clients", type=int, nargs="+", default=[4])
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument(
+            "--fps",
+            type=float,
+            default=15.0,
+            help="Frames per second per client; 0 sends the next frame once "
+            "the previous one is answered.",
+        )
+        parser.add_argument(
+            "--mode", nargs="+", default=["image"], choices=["image", "json", "binary"]
+        )
+        parser.add_argument(
+            "--codec", nargs="+", default=[settings.VISION_OUTPUT_CODEC]
+        )
+        parser.add_argument(
+            "--imgsz", type=int, nargs="+", default=[settings.VISION_IMGSZ]
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            nargs="+",
+            default=[settings.VISION_BATCH_MAX_SIZE],
+        )
+        parser.add_argument(
+            "--backend",
+            nargs="+",
+            default=[settings.VISION_BACKEND],
+            choices=list(BACKENDS),
+        )
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument(
+            "--baseline", help="Results file from an earlier run to compare against."
+        )
+        # Runs a single configuration in this process; set by the parent.
+        parser.add_argument("--child", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        frames = load_frames(options["frames"])
+
+        if options["child"]:
+            config = json.loads(options["child"])
+            result = asyncio.run(run_configuration(config, frames, options))
+            Path(options["output"]).write_text(json.dumps(result))
+            return
+
+        # Backend and batching are server settings, so a remote server only
+        # varies what clients can choose.
+        server_keys = ["backend", "batch_size"] if not options["url"] else []
+        keys = ["clients", "mode", "codec", "imgsz"] + server_keys
+        configs = [
+            dict(zip(keys, values))
+            for values in itertools.product(*(options[key] for key in keys))
+        ]
+
+        results = []
+        for config in configs:
+            self.stdout.write(f"Running {config} for {options['duration']:.0f}s")
+            if options["url"]:
+                result = asyncio.run(run_configuration(config, frames, options))
+            else:
+                result = self.run_isolated(config, options)
+            results.append(result)
+            self.stdout.write(self.format_result(result))
+
+        report = {
+            "commit": git_commit(),
+            "frames": options["frames"] or str(ASSETS),
+            "duration": options["duration"],
+            "fps": options["fps"],
+            "target": options["url"] or "in-process",
+            "results": results,
+        }
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        if options["baseline"]:
+            self.compare(report, json.loads(Path(options["baseline"]).read_text()))
+
+    def run_isolated(self, config, options):
+        """
+        Runs one configuration in a fresh process so settings, model
+        workers and peak RSS do not carry over between configurations.
+        """
+        env = dict(
+            os.environ,
+            VISION_BACKEND=config["backend"],
+            VISION_BATCH_MAX_SIZE=str(config["batch_size"]),
+        )
+        if config["backend"] != settings.VISION_BACKEND:
+            env.pop("VISION_MODEL_PATH", None)
+
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            command = [
+                sys.executable,
+                str(settings.BASE_DIR / "manage.py"),
+                "benchmark_vision",
+                "--child",
+                json.dumps(config),
+                "--output",
+                output.name,
+                "--duration",
+                str(options["duration"]),
+                "--fps",
+                str(options["fps"]),
+            ]
+            if options["frames"]:
+                command += ["--frames", options["frames"]]
+            process = subprocess.run(command, env=env)
+            if process.returncode != 0:
+                raise CommandError(f"Benchmark of {config} failed.")
+            return json.loads(Path(output.name).read_text())
+
+    def format_result(self, result):
+        latency = result["latency_ms"]
+        line = (
+            f"  {result['throughput_fps']} fps, p50 {latency['p50']} ms, "
+            f"p99 {latency['p99']} ms, {result['processed']}/{result['sent']} "
+            f"processed, {result['dropped']} dropped, {result['errors']} errors"
+        )
+        if "peak_rss_mb" in result:
+            line += (
+                f", {result['peak_rss_mb']} MB peak RSS, {result['cpu_percent']}% CPU"
+            )
+        return line
+
+    def compare(self, report, baseline):
+        previous = {
+            config_key(result["config"]): result for result in baseline["results"]
+        }
+        self.stdout.write(f"Compared with {baseline.get('commit') or 'baseline'}:")
+        for result in report["results"]:
+            before = previous.get(config_key(result["config"]))
+            if before is None:
+                continue
+            changes = []
+            for name, now, then in (
+                ("throughput", result["throughput_fps"], before["throughput_fps"]),
+                ("p99", result["latency_ms"]["p99"], before["latency_ms"]["p99"]),
+            ):
+                if now is not None and then:
+                    changes.append(f"{name} {(now - then) / then:+.1%}")
+            self.stdout.write(f"  {result['config']}: {', '.join(changes)}")
@@ -0,0 +1,125 @@
+import time
+import numpy as np
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ultralytics import YOLO
+from ultralytics.utils import ASSETS
+from process.backends import BACKENDS, measure_latency, warmup
+
+
+def box_iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / (area + areas - inter + 1e-9)
+
+
+def agreement(reference, candidate, threshold=0.5):
+    """
+    Share of reference detections matched by a candidate detection of the
+    same class with IoU of at least ``threshold``.
+    """
+    reference = reference.boxes.cpu().numpy()
+    candidate = candidate.boxes.cpu().numpy()
+    if len(reference) == 0:
+        return 1.0 if len(candidate) == 0 else 0.0
+
+    matched = 0
+    for box, cls in zip(reference.xyxy, reference.cls):
+        same_class = candidate.xyxy[candidate.cls == cls]
+        if len(same_class) and box_iou(box, same_class).max() >= threshold:
+            matched += 1
+    return matched / len(reference)
+
+
+def quantize_onnx(path):
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError:
+        raise CommandError("INT8 ONNX export requires the onnxruntime package.")
+
+    output = str(Path(path).with_suffix("")) + "_int8.onnx"
+    quantize_dynamic(path, output, weight_type=QuantType.QUInt8)
+    return output
+
+
+class Command(BaseCommand):
+    help = "Exports the vision model for a CPU inference runtime and validates it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "backend", choices=[backend for backend in BACKENDS if backend != "pytorch"]
+        )
+        parser.add_argument("--source", default=settings.VISION_SOURCE_MODEL)
+        parser.add_argument("--imgsz", type=int, default=settings.VISION_IMGSZ)
+        parser.add_argument(
+            "--int8", action="store_true", help="Quantize the exported model to INT8."
+        )
+        parser.add_argument(
+            "--data", help="Calibration dataset for OpenVINO INT8 quantization."
+        )
+        parser.add_argument(
+            "--min-agreement",
+            type=float,
+            default=0.9,
+            help="Minimum share of source detections the export must reproduce.",
+        )
+        parser.add_argument("--skip-validation", action="store_true")
+
+    def handle(self, *args, **options):
+        backend = options["backend"]
+        source = YOLO(options["source"])
+        imgsz = options["imgsz"]
+
+        export_args = {"format": backend, "imgsz": imgsz}
+        if backend in ("onnx", "openvino"):
+            # Batches from the scheduler vary in size.
+            export_args["dynamic"] = True
+        if options["int8"] and backend == "openvino":
+            export_args["int8"] = True
+            if options["data"]:
+                export_args["data"] = options["data"]
+        elif options["int8"] and backend == "torchscript":
+            raise CommandError("INT8 quantization is not supported for torchscript.")
+
+        started = time.perf_counter()
+        path = source.export(**export_args)
+        if options["int8"] and backend == "onnx":
+            path = quantize_onnx(path)
+        self.stdout.write(f"Exported {path} in {time.perf_counter() - started:.1f}s")
+
+        if not options["skip_validation"]:
+            self.validate(source, path, imgsz, options["min_agreement"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Set VISION_BACKEND={backend} and VISION_MODEL_PATH={path} to use it."
+            )
+        )
+
+    def validate(self, source, path, imgsz, min_agreement):
+        exported = YOLO(path, task="detect")
+        images = sorted(str(image) for image in Path(ASSETS).glob("*.jpg"))
+
+        scores = []
+        for image in images:
+            reference = source(image, imgsz=imgsz, verbose=False)[0]
+            candidate = exported(image, imgsz=imgsz, verbose=False)[0]
+            scores.append(agreement(reference, candidate))
+        score = sum(scores) / len(scores)
+
+        for name, model in (("source", source), ("export", exported)):
+            warmup(model, settings.VISION_WARMUP_RUNS, imgsz)
+            latency = measure_latency(model, 20, imgsz)
+            self.stdout.write(f"{name}: {latency:.1f} ms/frame")
+
+        self.stdout.write(f"Detection agreement with source: {score:.1%}")
+        if score < min_agreement:
+            raise CommandError(
+                f"Exported model agreement {score:.1%} is below {min_agreement:.0%}."
+            )
@@ -0,0 +1,41 @@
+from vision.metrics import Counter, Gauge, Histogram
+from . import batching
+from . import inference
+
+
+def queue_depth():
+    """
+    Frames waiting in the batch scheduler and in each inference worker
+    queue. Empty until the first frame starts the workers.
+    """
+    depths = {}
+    if batching._scheduler is not None:
+        depths[("batching",)] = batching._scheduler.stats()["pending"]
+    if inference._executor is not None:
+        for worker in inference._executor.stats():
+            depths[(f"worker-{worker['worker']}",)] = worker["queue_depth"]
+    return depths
+
+
+STAGE_SECONDS = Histogram(
+    "vision_stage_seconds",
+    "Time spent per frame in each processing stage.",
+    ["stage"],
+)
+FRAME_LAG_SECONDS = Histogram(
+    "vision_frame_lag_seconds",
+    "Time from receiving a frame to sending its reply.",
+)
+FRAMES = Counter("vision_frames_total", "Frames by outcome.", ["outcome"])
+CONNECTIONS = Gauge("vision_connections", "Open vision websocket connections.")
+QUEUE_DEPTH = Gauge(
+    "vision_queue_depth",
+    "Frames waiting for inference.",
+    ["queue"],
+    collect=queue_depth,
+)
+
+
+def observe_timings(timings):
+    for stage, value in timings.items():
+        STAGE_SECONDS.observe(value / 1000, stage=stage)
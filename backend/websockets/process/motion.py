@@ -0,0 +1,101 @@
+import threading
+import cv2
+import numpy as np
+from ultralytics.engine.results import Results
+from ultralytics.trackers.basetrack import BaseTrack
+from ultralytics.trackers.byte_tracker import BYTETracker, STrack
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+# Motion is measured on a small grayscale thumbnail of each frame.
+THUMBNAIL_SIZE = (64, 48)
+
+_tracker_config = None
+_tracker_lock = threading.Lock()
+
+
+def create_tracker():
+    """
+    Builds a ByteTrack tracker. BYTETracker resets the track id counter it
+    shares with every other tracker, so the counter is restored to keep ids
+    unique across connections.
+    """
+    global _tracker_config
+    with _tracker_lock:
+        if _tracker_config is None:
+            _tracker_config = IterableSimpleNamespace(
+                **yaml_load(check_yaml("bytetrack.yaml"))
+            )
+        count = BaseTrack._count
+        tracker = BYTETracker(_tracker_config)
+        BaseTrack._count = count
+    return tracker
+
+
+class MotionState:
+    """
+    Per-connection state for motion gating. The detector only runs when
+    the scene has changed by more than ``threshold`` (mean absolute pixel
+    difference, 0-1) since the last detection, or every
+    ``keyframe_interval`` frames. In between, a ByteTrack tracker carries
+    the last boxes forward with stable track ids.
+    """
+
+    def __init__(self, threshold, keyframe_interval):
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.reference = None
+        self.since_detection = 0
+        self.tracker = None
+        self.detected = 0
+        self.skipped = 0
+
+    def thumbnail(self, image):
+        small = cv2.resize(image, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def needs_detection(self, image):
+        thumbnail = self.thumbnail(image)
+        if (
+            self.reference is None
+            or self.since_detection >= self.keyframe_interval
+            or np.abs(thumbnail - self.reference).mean() / 255 > self.threshold
+        ):
+            self.reference = thumbnail
+            self.since_detection = 0
+            self.detected += 1
+            return True
+
+        self.since_detection += 1
+        self.skipped += 1
+        return False
+
+    def track(self, result):
+        """
+        Feeds fresh detections to the tracker and returns the result with
+        tracked boxes and their ids.
+        """
+        if self.tracker is None:
+            self.tracker = create_tracker()
+        tracks = self.tracker.update(result.boxes.cpu().numpy(), result.orig_img)
+        if len(tracks) == 0:
+            result.update(boxes=np.zeros((0, 7), dtype=np.float32))
+            return result
+        result = result[tracks[:, -1].astype(int)]
+        result.update(boxes=tracks[:, :-1])
+        return result
+
+    def carry_forward(self, image, names):
+        """
+        Predicts where tracked boxes moved to without running the detector.
+        """
+        tracks = []
+        if self.tracker is not None:
+            active = [t for t in self.tracker.tracked_stracks if t.is_activated]
+            STrack.multi_predict(active)
+            tracks = [t.result[:-1] for t in active]
+        boxes = np.array(tracks, dtype=np.float32).reshape(-1, 7)
+        return Results(orig_img=image, path="", names=names, boxes=boxes)
+
+    def stats(self):
+        return {"detected": self.detected, "skipped": self.skipped}
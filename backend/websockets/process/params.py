@@ -0,0 +1,136 @@
+from django.conf import settings
+from . import codecs
+from . import protocol
+
+# Options that change the model call. Frames can only share a batch when
+# these match.
+PREDICT_KEYS = ("imgsz", "classes", "conf", "iou", "max_det")
+
+# Options that invalidate a connection's motion reference and tracks.
+SCENE_KEYS = PREDICT_KEYS + ("roi", "motion")
+
+
+def default_options():
+    return {
+        "mode": protocol.IMAGE,
+        "codec": settings.VISION_OUTPUT_CODEC,
+        "quality": settings.VISION_OUTPUT_QUALITY,
+        "imgsz": settings.VISION_IMGSZ,
+        "classes": None,
+        "conf": 0.25,
+        "iou": 0.7,
+        "max_det": 300,
+        "roi": None,
+        "motion": False,
+    }
+
+
+def _ratio(value, name):
+    value = float(value)
+    if not 0 <= value <= 1:
+        raise ValueError(f"{name} must be between 0 and 1.")
+    return value
+
+
+def parse_options(config, current):
+    """
+    Validates a client configuration message against the current options
+    and returns the updated options. Raises ValueError with a message that
+    can be sent back to the client.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("Invalid configuration message.")
+
+    options = dict(current)
+    try:
+        if "mode" in config:
+            if config["mode"] not in protocol.MODES:
+                raise ValueError(f"Unsupported mode: {config['mode']}")
+            options["mode"] = config["mode"]
+
+        if "codec" in config:
+            if config["codec"] not in codecs.ENCODERS:
+                raise ValueError(f"Unsupported codec: {config['codec']}")
+            options["codec"] = config["codec"]
+
+        if "quality" in config:
+            options["quality"] = int(config["quality"])
+            if not 1 <= options["quality"] <= 100:
+                raise ValueError("quality must be between 1 and 100.")
+
+        if "imgsz" in config:
+            options["imgsz"] = int(config["imgsz"])
+            if not 32 <= options["imgsz"] <= settings.VISION_MAX_IMGSZ:
+                raise ValueError(
+                    f"imgsz must be between 32 and {settings.VISION_MAX_IMGSZ}."
+                )
+            # The model stride is 32, round up like ultralytics would.
+            options["imgsz"] = -(-options["imgsz"] // 32) * 32
+
+        if "classes" in config:
+            classes = config["classes"]
+            if isinstance(classes, (str, int)):
+                classes = [classes]
+            if classes and not all(isinstance(c, (str, int)) for c in classes):
+                raise ValueError("classes must be a list of class ids or labels.")
+            options["classes"] = tuple(classes) if classes else None
+
+        if "conf" in config:
+            options["conf"] = _ratio(config["conf"], "conf")
+
+        if "iou" in config:
+            options["iou"] = _ratio(config["iou"], "iou")
+
+        if "max_det" in config:
+            options["max_det"] = int(config["max_det"])
+            if not 1 <= options["max_det"] <= 300:
+                raise ValueError("max_det must be between 1 and 300.")
+
+        if "roi" in config:
+            roi = config["roi"]
+            if roi:
+                x1, y1, x2, y2 = (_ratio(v, "roi") for v in roi)
+                if x2 <= x1 or y2 <= y1:
+                    raise ValueError(
+                        "roi must be [x1, y1, x2, y2] with x1 < x2, y1 < y2."
+                    )
+                roi = (x1, y1, x2, y2)
+            options["roi"] = roi or None
+
+        if "motion" in config:
+            options["motion"] = bool(config["motion"])
+    except (TypeError, ValueError) as e:
+        raise ValueError(str(e) or "Invalid configuration message.")
+
+    return options
+
+
+def resolve_classes(classes, names):
+    """
+    Maps a client class list, which may mix ids and label names, to the
+    class ids of the loaded model. Unknown labels are ignored.
+    """
+    if classes is None:
+        return None
+    ids = {name: index for index, name in names.items()}
+    resolved = []
+    for value in classes:
+        if isinstance(value, int):
+            resolved.append(value)
+        elif value in ids:
+            resolved.append(ids[value])
+    return resolved
+
+
+def parse_stock_labels(labels):
+    """
+    Validates a ``{"label": "product-slug"}`` mapping for stock sync.
+    """
+    if not labels:
+        return {}
+    if not isinstance(labels, dict) or not all(
+        isinstance(label, str) and isinstance(slug, str)
+        for label, slug in labels.items()
+    ):
+        raise ValueError("stock must map detected labels to product slugs.")
+    return dict(labels)
@@ -0,0 +1,122 @@
+import time
+from collections import Counter
+import numpy as np
+from . import codecs
+from . import protocol
+from .params import PREDICT_KEYS, resolve_classes
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def crop(image, roi):
+    """
+    Crops ``image`` to a normalized ``(x1, y1, x2, y2)`` region and returns
+    it with the pixel offset of its top-left corner.
+    """
+    if roi is None:
+        return image, (0, 0)
+    height, width = image.shape[:2]
+    x1, y1, x2, y2 = roi
+    left, top = int(x1 * width), int(y1 * height)
+    right, bottom = max(int(x2 * width), left + 1), max(int(y2 * height), top + 1)
+    return np.ascontiguousarray(image[top:bottom, left:right]), (left, top)
+
+
+def count_labels(result):
+    class_ids = result.boxes.cpu().numpy().cls
+    return dict(Counter(result.names[int(class_id)] for class_id in class_ids))
+
+
+def decode_size(options):
+    """
+    Smallest longest-side the full frame may be decoded at so that the
+    region the model sees is still at least ``imgsz``.
+    """
+    if options["roi"] is None:
+        return options["imgsz"]
+    x1, y1, x2, y2 = options["roi"]
+    return int(options["imgsz"] / min(x2 - x1, y2 - y1))
+
+
+class FrameError(Exception):
+    pass
+
+
+def prepare(bytes_data, options, motion, slot):
+    """
+    Decodes and crops one frame. Returns ``(region, origin, shape,
+    timings, needs_detection)``.
+    """
+    started = time.perf_counter()
+    image = codecs.decode(bytes_data, decode_size(options), slot)
+    if image is None:
+        raise FrameError("Frame could not be decoded.")
+    timings = {"decode": elapsed_ms(started)}
+    started = time.perf_counter()
+    region, origin = crop(image, options["roi"])
+    needs_detection = not options["motion"] or motion.needs_detection(region)
+    timings["preprocess"] = elapsed_ms(started)
+    return region, origin, image.shape[:2], timings, needs_detection
+
+
+def process_frames(model, frames):
+    """
+    Runs a batch of ``(frame_id, bytes_data, options, motion)`` frames
+    through the model and returns a ``(reply, timings, counts)`` tuple for
+    each of them, where ``counts`` maps detected labels to their number.
+    Frames are grouped so each distinct set of predict options gets one
+    call, and frames in motion mode skip the model when their scene has
+    not changed. A frame that fails on its own, e.g. one that does not
+    decode, gets its exception in place of the tuple so the other frames
+    in the batch are unaffected.
+    """
+    groups = {}
+    for index, (_, _, options, _) in enumerate(frames):
+        key = tuple(options[name] for name in PREDICT_KEYS)
+        groups.setdefault(key, []).append(index)
+
+    replies = [None] * len(frames)
+    for key, indexes in groups.items():
+        predict = dict(zip(PREDICT_KEYS, key))
+        predict["classes"] = resolve_classes(predict["classes"], model.names)
+
+        prepared = []
+        for slot, index in enumerate(indexes):
+            _, bytes_data, options, motion = frames[index]
+            try:
+                prepared.append((index, *prepare(bytes_data, options, motion, slot)))
+            except Exception as e:
+                replies[index] = e
+
+        detect = [item for item in prepared if item[5]]
+        results = {}
+        inference_time = 0.0
+        if detect:
+            started = time.perf_counter()
+            detected = model([item[1] for item in detect], verbose=False, **predict)
+            inference_time = elapsed_ms(started)
+            for item, result in zip(detect, detected):
+                results[item[0]] = result
+
+        for index, region, origin, shape, timings, needs_detection in prepared:
+            frame_id, _, options, motion = frames[index]
+            result = results.get(index)
+            timings["inference"] = inference_time if needs_detection else 0.0
+            try:
+                if options["motion"]:
+                    started = time.perf_counter()
+                    if result is None:
+                        result = motion.carry_forward(region, model.names)
+                    else:
+                        result = motion.track(result)
+                    timings["track"] = elapsed_ms(started)
+                reply = protocol.render(
+                    frame_id, result, options, origin, shape, timings
+                )
+                replies[index] = (reply, timings, count_labels(result))
+            except Exception as e:
+                replies[index] = e
+
+    return replies
@@ -0,0 +1,96 @@
+import json
+import time
+import numpy as np
+from . import codecs
+
+IMAGE = "image"
+JSON = "json"
+BINARY = "binary"
+
+MODES = (IMAGE, JSON, BINARY)
+
+# Binary detections frame: a fixed header followed by ``count`` records.
+HEADER_DTYPE = np.dtype(
+    [("frame_id", "<u4"), ("width", "<u2"), ("height", "<u2"), ("count", "<u2")]
+)
+# ``track_id`` is -1 unless motion mode is tracking the object.
+DETECTION_DTYPE = np.dtype(
+    [("box", "<f4", (4,)), ("class_id", "<u2"), ("score", "<f4"), ("track_id", "<i4")]
+)
+
+
+def render_image(result, codec, quality, timings):
+    started = time.perf_counter()
+    plotted = result.plot()
+    timings["plot"] = round((time.perf_counter() - started) * 1000, 2)
+    return codecs.encode(plotted, codec, quality)
+
+
+def offset_boxes(boxes, origin):
+    return boxes.xyxy.astype(np.float64) + np.array(origin * 2)
+
+
+def track_ids(boxes):
+    if not boxes.is_track:
+        return np.full(len(boxes), -1, dtype=np.int32)
+    return boxes.id.astype(np.int32)
+
+
+def render_json(frame_id, result, origin, shape):
+    boxes = result.boxes.cpu().numpy()
+    class_ids = boxes.cls.astype(np.uint16)
+    height, width = shape
+    detections = {
+        "frame_id": frame_id,
+        "width": width,
+        "height": height,
+        "boxes": offset_boxes(boxes, origin).round(1).tolist(),
+        "class_ids": class_ids.tolist(),
+        "labels": [result.names[int(c)] for c in class_ids],
+        "scores": boxes.conf.astype(np.float64).round(3).tolist(),
+    }
+    if boxes.is_track:
+        detections["track_ids"] = track_ids(boxes).tolist()
+    return json.dumps(detections)
+
+
+def render_binary(frame_id, result, origin, shape):
+    boxes = result.boxes.cpu().numpy()
+    height, width = shape
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header[0] = (frame_id, width, height, len(boxes))
+
+    detections = np.zeros(len(boxes), dtype=DETECTION_DTYPE)
+    detections["box"] = offset_boxes(boxes, origin)
+    detections["class_id"] = boxes.cls
+    detections["score"] = boxes.conf
+    detections["track_id"] = track_ids(boxes)
+
+    return header.tobytes() + detections.tobytes()
+
+
+def render(frame_id, result, options, origin=(0, 0), shape=None, timings=None):
+    """
+    Returns the reply for one frame: ``bytes`` for image and binary modes,
+    ``str`` for JSON mode. Detections are shifted by ``origin`` so boxes
+    found in a region of interest refer to the full decoded frame of size
+    ``shape``, which is reported as ``width`` and ``height``. Frames may be
+    decoded smaller than they were sent, and larger with a region of
+    interest than without, so clients scale boxes by the reported size
+    rather than their own. The ``plot`` and ``encode`` times in
+    milliseconds are recorded in ``timings`` when given.
+    """
+    timings = {} if timings is None else timings
+    timings["plot"] = 0.0
+    started = time.perf_counter()
+    shape = shape or result.orig_shape
+    if options["mode"] == JSON:
+        reply = render_json(frame_id, result, origin, shape)
+    elif options["mode"] == BINARY:
+        reply = render_binary(frame_id, result, origin, shape)
+    else:
+        reply = render_image(result, options["codec"], options["quality"], timings)
+    total = round((time.perf_counter() - started) * 1000, 2)
+    timings["encode"] = round(total - timings["plot"], 2)
+    return reply
@@ -0,0 +1,109 @@
+import logging
+import statistics
+from collections import deque
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=settings.INVENTORY_API_URL, timeout=settings.INVENTORY_API_TIMEOUT
+        )
+    return _client
+
+
+class StockAggregator:
+    """
+    Turns one camera's per-frame detection counts into debounced stock
+    changes. Counts are smoothed with a median over a sliding window, the
+    first full window sets the baseline, and a new level only becomes a
+    change once it has held for ``debounce`` seconds. Changes accumulate
+    per product until the next flush.
+    """
+
+    def __init__(self, labels, window, debounce):
+        self.labels = labels
+        self.window = window
+        self.debounce = debounce
+        self.samples = deque()
+        self.started_at = None
+        self.committed = {}
+        self.candidates = {}
+        self.pending = {}
+
+    def add(self, counts, now):
+        if self.started_at is None:
+            self.started_at = now
+        self.samples.append((now, counts))
+        while now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+        if now - self.started_at < self.window:
+            return
+
+        for label, slug in self.labels.items():
+            level = round(
+                statistics.median(sample.get(label, 0) for _, sample in self.samples)
+            )
+            if label not in self.committed:
+                self.committed[label] = level
+                continue
+
+            if level == self.committed[label]:
+                self.candidates.pop(label, None)
+                continue
+
+            candidate, since = self.candidates.get(label, (None, now))
+            if candidate != level:
+                self.candidates[label] = (level, now)
+            elif now - since >= self.debounce:
+                delta = level - self.committed[label]
+                self.pending[slug] = self.pending.get(slug, 0) + delta
+                self.committed[label] = level
+                del self.candidates[label]
+
+    def collect(self):
+        updates = [
+            {"slug": slug, "delta": delta}
+            for slug, delta in self.pending.items()
+            if delta
+        ]
+        self.pending = {}
+        return updates
+
+    def restore(self, updates):
+        for update in updates:
+            self.pending[update["slug"]] = (
+                self.pending.get(update["slug"], 0) + update["delta"]
+            )
+
+
+async def push_updates(updates, access_token):
+    """
+    Sends one batch of stock changes to the inventory API on behalf of
+    the user owning ``access_token``. Returns False if they should be
+    retried: on network and server errors, throttling, and rejected
+    credentials, which a later token refresh or rate window may fix.
+    """
+    try:
+        response = await get_client().post(
+            "stock/sync",
+            json={"updates": updates},
+            cookies={"access": access_token},
+        )
+    except httpx.HTTPError as e:
+        logger.warning("Stock sync failed: %s", e)
+        return False
+
+    if response.status_code >= 500 or response.status_code in (401, 403, 429):
+        logger.warning("Stock sync failed with status %s", response.status_code)
+        return False
+    if response.status_code != 200:
+        logger.warning("Stock sync rejected: %s", response.text)
+    return True
@@ -1,3 +1,349 @@
-from django.test import TestCase
+import asyncio
+import concurrent.futures
+import io
+import json
+import threading
+import types
+from unittest import mock
+import httpx
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from PIL import Image
+from . import codecs, inference, protocol, stock
+from .batching import BatchScheduler
+from .frames import LatestFrameSlot
+from .inference import InferenceExecutor, InferenceQueueFull
+from .params import default_options, parse_options, parse_stock_labels, resolve_classes
+from .pipeline import FrameError, process_frames
+from .stock import StockAggregator
+from .views import inference_stats_view
 
-# Create your tests here.
+
+class StockAggregatorTests(SimpleTestCase):
+    def setUp(self):
+        self.aggregator = StockAggregator({"apple": "apple-slug"}, window=2, debounce=3)
+
+    def feed(self, count, start, end):
+        for now in range(start, end):
+            self.aggregator.add({"apple": count}, now)
+
+    def test_first_full_window_sets_the_baseline(self):
+        self.feed(4, 0, 5)
+        self.assertEqual(self.aggregator.committed, {"apple": 4})
+        self.assertEqual(self.aggregator.collect(), [])
+
+    def test_change_is_reported_once_it_holds_for_the_debounce(self):
+        self.feed(4, 0, 5)
+        self.feed(6, 5, 8)
+        self.assertEqual(self.aggregator.collect(), [])
+        self.feed(6, 8, 10)
+        self.assertEqual(
+            self.aggregator.collect(), [{"slug": "apple-slug", "delta": 2}]
+        )
+        self.assertEqual(self.aggregator.collect(), [])
+
+    def test_brief_flicker_is_ignored(self):
+        self.feed(4, 0, 5)
+        self.aggregator.add({"apple": 9}, 5)
+        self.feed(4, 6, 20)
+        self.assertEqual(self.aggregator.collect(), [])
+
+    def test_restored_updates_merge_with_new_changes(self):
+        self.feed(4, 0, 5)
+        self.feed(3, 5, 12)
+        self.aggregator.restore([{"slug": "apple-slug", "delta": 2}])
+        self.assertEqual(
+            self.aggregator.collect(), [{"slug": "apple-slug", "delta": 1}]
+        )
+
+
+class PushUpdatesTests(SimpleTestCase):
+    def push(self, status_code):
+        def handler(request):
+            return httpx.Response(status_code, json={})
+
+        client = httpx.AsyncClient(
+            base_url="http://inventory/", transport=httpx.MockTransport(handler)
+        )
+        with mock.patch.object(stock, "_client", client):
+            return async_to_sync(stock.push_updates)([], "token")
+
+    def test_retries_on_server_errors_throttling_and_credentials(self):
+        for status_code in (500, 503, 401, 403, 429):
+            with self.subTest(status_code=status_code), self.assertLogs(
+                "process.stock", "WARNING"
+            ):
+                self.assertFalse(self.push(status_code))
+
+    def test_success_and_rejections_are_not_retried(self):
+        self.assertTrue(self.push(200))
+        with self.assertLogs("process.stock", "WARNING"):
+            self.assertTrue(self.push(400))
+
+
+@override_settings(VISION_MAX_IMGSZ=1280)
+class ParseOptionsTests(SimpleTestCase):
+    def parse(self, config):
+        return parse_options(config, default_options())
+
+    def test_updates_only_the_given_options(self):
+        options = self.parse({"mode": "json", "conf": "0.5"})
+        self.assertEqual(options, {**default_options(), "mode": "json", "conf": 0.5})
+
+    def test_imgsz_rounds_up_to_the_model_stride(self):
+        self.assertEqual(self.parse({"imgsz": 330})["imgsz"], 352)
+
+    def test_classes_accept_a_single_id_or_label(self):
+        self.assertEqual(self.parse({"classes": "apple"})["classes"], ("apple",))
+        self.assertEqual(self.parse({"classes": [1, "pear"]})["classes"], (1, "pear"))
+        self.assertIsNone(self.parse({"classes": []})["classes"])
+
+    def test_roi_is_a_tuple_or_none(self):
+        self.assertEqual(
+            self.parse({"roi": [0, 0.25, 0.5, 1]})["roi"], (0.0, 0.25, 0.5, 1.0)
+        )
+        self.assertIsNone(self.parse({"roi": None})["roi"])
+
+    def test_invalid_values_raise_a_client_message(self):
+        for config, message in [
+            ([], "Invalid configuration message."),
+            ({"mode": "video"}, "Unsupported mode: video"),
+            ({"codec": "png"}, "Unsupported codec: png"),
+            ({"quality": 0}, "quality must be between 1 and 100."),
+            ({"imgsz": 2000}, "imgsz must be between 32 and 1280."),
+            ({"classes": [[1]]}, "classes must be a list of class ids or labels."),
+            ({"conf": 2}, "conf must be between 0 and 1."),
+            ({"max_det": 0}, "max_det must be between 1 and 300."),
+            (
+                {"roi": [0.5, 0, 0.5, 1]},
+                "roi must be [x1, y1, x2, y2] with x1 < x2, y1 < y2.",
+            ),
+            ({"roi": [0, 0, 1]}, "not enough values to unpack"),
+            ({"iou": "high"}, "could not convert string to float: 'high'"),
+        ]:
+            with self.subTest(config=config), self.assertRaisesMessage(
+                ValueError, message
+            ):
+                self.parse(config)
+
+    def test_resolve_classes_maps_labels_to_ids(self):
+        names = {0: "apple", 1: "pear"}
+        self.assertEqual(resolve_classes((1, "apple", "plum"), names), [1, 0])
+        self.assertIsNone(resolve_classes(None, names))
+
+    def test_stock_labels_must_map_strings_to_strings(self):
+        self.assertEqual(parse_stock_labels(None), {})
+        self.assertEqual(parse_stock_labels({"apple": "apple-1"}), {"apple": "apple-1"})
+        with self.assertRaises(ValueError):
+            parse_stock_labels({"apple": 1})
+
+
+class InferenceStatsViewTests(SimpleTestCase):
+    def get(self, is_staff):
+        request = RequestFactory().get("/process/stats")
+        request.user = types.SimpleNamespace(is_active=True, is_staff=is_staff)
+        return inference_stats_view(request)
+
+    def test_workers_are_not_started_to_report_stats(self):
+        with mock.patch.object(inference, "_executor", None), mock.patch.object(
+            inference, "InferenceExecutor"
+        ) as executor:
+            response = self.get(is_staff=True)
+        executor.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(json.loads(response.content)["workers"])
+
+    def test_non_staff_are_sent_to_log_in(self):
+        self.assertEqual(self.get(is_staff=False).status_code, 302)
+
+
+def encoded_frame(width=64, height=48, format="JPEG"):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height)).save(output, format=format)
+    return output.getvalue()
+
+
+class StubBoxes:
+    is_track = False
+
+    def __init__(self):
+        self.xyxy = np.array([[1, 2, 11, 22]], dtype=np.float32)
+        self.cls = np.array([0], dtype=np.float32)
+        self.conf = np.array([0.9], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+
+class StubModel:
+    names = {0: "apple"}
+
+    def __call__(self, images, **predict):
+        return [
+            types.SimpleNamespace(names=self.names, boxes=StubBoxes()) for _ in images
+        ]
+
+
+class InlineExecutor:
+    def submit(self, func, items):
+        future = concurrent.futures.Future()
+        future.set_result(func(items))
+        return future
+
+
+class BadFrameTests(SimpleTestCase):
+    def test_data_that_is_not_an_image_does_not_decode(self):
+        self.assertIsNone(codecs.decode(b"garbage", imgsz=32))
+        self.assertIsNone(codecs.decode(b"garbage"))
+
+    def test_only_the_bad_frame_in_a_batch_fails(self):
+        options = dict(default_options(), mode=protocol.JSON)
+        replies = process_frames(
+            StubModel(),
+            [(1, encoded_frame(), options, None), (2, b"garbage", options, None)],
+        )
+        self.assertEqual(json.loads(replies[0][0])["frame_id"], 1)
+        self.assertEqual(replies[0][2], {"apple": 1})
+        self.assertIsInstance(replies[1], FrameError)
+
+    async def test_batch_error_reaches_only_the_frame_that_failed(self):
+        def batch_func(items):
+            return [ValueError(item) if item == "bad" else item for item in items]
+
+        scheduler = BatchScheduler(InlineExecutor(), batch_func, 2, 1000)
+        good, bad = await asyncio.gather(
+            scheduler.submit("good"), scheduler.submit("bad"), return_exceptions=True
+        )
+        self.assertEqual(good, "good")
+        self.assertIsInstance(bad, ValueError)
+
+
+class InferenceExecutorTests(SimpleTestCase):
+    async def test_full_queues_reject_new_work(self):
+        started, release = threading.Event(), threading.Event()
+
+        def blocking(model, value):
+            started.set()
+            release.wait(5)
+            return model, value
+
+        executor = InferenceExecutor(1, 1, model_factory=lambda index: "model")
+        running = executor.submit(blocking, 1)
+        self.assertTrue(started.wait(5))
+        queued = executor.submit(blocking, 2)
+        with self.assertRaises(InferenceQueueFull):
+            executor.submit(blocking, 3)
+
+        release.set()
+        self.assertEqual(await running, ("model", 1))
+        self.assertEqual(await queued, ("model", 2))
+        self.assertEqual(executor.stats()[0]["processed"], 2)
+
+    async def test_jobs_fail_when_the_model_does_not_load(self):
+        def broken(index):
+            raise RuntimeError("no weights")
+
+        executor = InferenceExecutor(1, 1, model_factory=broken)
+        with self.assertRaisesMessage(RuntimeError, "no weights"):
+            await executor.submit(lambda model: model)
+
+
+class LatestFrameSlotTests(SimpleTestCase):
+    async def test_newer_frame_replaces_the_waiting_one(self):
+        slot = LatestFrameSlot()
+        for frame in ("first", "second", "third"):
+            slot.put(frame)
+        frame, _ = await slot.get()
+        self.assertEqual(frame, "third")
+        self.assertEqual(slot.dropped, 2)
+
+    async def test_get_waits_for_the_next_frame(self):
+        slot = LatestFrameSlot()
+        slot.put("first")
+        await slot.get()
+        waiting = asyncio.ensure_future(slot.get())
+        await asyncio.sleep(0)
+        self.assertFalse(waiting.done())
+        slot.put("second")
+        self.assertEqual((await waiting)[0], "second")
+        self.assertEqual(slot.dropped, 0)
+
+
+class ProtocolRenderTests(SimpleTestCase):
+    def setUp(self):
+        self.result = StubModel()([None])[0]
+
+    def render(self, mode):
+        options = dict(default_options(), mode=mode)
+        return protocol.render(7, self.result, options, (100, 50), (360, 640))
+
+    def test_json_detections_are_offset_by_the_origin(self):
+        detections = json.loads(self.render(protocol.JSON))
+        self.assertEqual(
+            detections,
+            {
+                "frame_id": 7,
+                "width": 640,
+                "height": 360,
+                "boxes": [[101.0, 52.0, 111.0, 72.0]],
+                "class_ids": [0],
+                "labels": ["apple"],
+                "scores": [0.9],
+            },
+        )
+
+    def test_binary_frame_round_trips(self):
+        reply = self.render(protocol.BINARY)
+        header = np.frombuffer(reply, protocol.HEADER_DTYPE, count=1)[0]
+        detections = np.frombuffer(
+            reply, protocol.DETECTION_DTYPE, offset=protocol.HEADER_DTYPE.itemsize
+        )
+        self.assertEqual(header.tolist(), (7, 640, 360, 1))
+        self.assertEqual(detections["box"].tolist(), [[101.0, 52.0, 111.0, 72.0]])
+        self.assertEqual(detections["class_id"].tolist(), [0])
+        self.assertAlmostEqual(float(detections["score"][0]), 0.9, places=6)
+        self.assertEqual(detections["track_id"].tolist(), [-1])
+
+
+class CodecTests(SimpleTestCase):
+    def test_buffers_are_reused_per_slot_and_shape(self):
+        pool = codecs.BufferPool()
+        buffer = pool.get(0, (2, 3, 3))
+        self.assertIs(pool.get(0, (2, 3, 3)), buffer)
+        self.assertIsNot(pool.get(1, (2, 3, 3)), buffer)
+        self.assertIsNot(pool.get(0, (3, 3, 3)), buffer)
+
+    def test_buffers_are_not_shared_between_threads(self):
+        pool = codecs.BufferPool()
+        buffer = pool.get(0, (2, 3, 3))
+        others = []
+        thread = threading.Thread(target=lambda: others.append(pool.get(0, (2, 3, 3))))
+        thread.start()
+        thread.join()
+        self.assertIsNot(others[0], buffer)
+
+    def test_jpeg_is_decoded_at_a_reduced_scale(self):
+        image = codecs.decode(encoded_frame(640, 480), imgsz=160)
+        self.assertEqual(image.shape, (120, 160, 3))
+
+    def test_other_formats_are_resized_into_the_slot_buffer(self):
+        image = codecs.decode(encoded_frame(640, 480, format="PNG"), imgsz=100, slot=3)
+        self.assertEqual(image.shape, (75, 100, 3))
+        self.assertIs(image, codecs.buffers.get(3, (75, 100, 3)))
+
+    def test_small_frames_keep_their_size(self):
+        image = codecs.decode(encoded_frame(64, 48), imgsz=640)
+        self.assertEqual(image.shape, (48, 64, 3))
+
+    def test_encoded_frames_decode_back(self):
+        image = np.zeros((48, 64, 3), dtype=np.uint8)
+        for codec in codecs.ENCODERS:
+            decoded = codecs.decode(codecs.encode(image, codec, 80))
+            self.assertEqual(decoded.shape, image.shape)
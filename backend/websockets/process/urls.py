@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import inference_stats_view
+
+urlpatterns = [
+    path("stats", inference_stats_view, name="inference-stats"),
+]
@@ -1,3 +1,16 @@
-from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from . import batching, inference
 
-# Create your views here.
+
+@staff_member_required
+def inference_stats_view(request):
+    # Read what is running rather than starting the workers just to report.
+    executor = inference._executor
+    scheduler = batching._scheduler
+    return JsonResponse(
+        {
+            "workers": executor.stats() if executor else None,
+            "batching": scheduler.stats() if scheduler else None,
+        }
+    )
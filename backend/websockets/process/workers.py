@@ -0,0 +1,196 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from django.conf import settings
+from ultralytics.engine.results import Results
+from .backends import model_path
+
+# Detections come back as rows of x1, y1, x2, y2, confidence, class.
+DETECTION_COLUMNS = 6
+MAX_DETECTIONS = 300
+
+
+def worker_cpus(index, workers):
+    """
+    Splits the host's cores evenly between worker processes.
+    """
+    count = os.cpu_count() or 1
+    per_worker = max(count // workers, 1)
+    start = (index * per_worker) % count
+    return set(range(start, min(start + per_worker, count)))
+
+
+def frame_view(memory, slot, slot_bytes, shape):
+    return np.ndarray(
+        shape, dtype=np.uint8, buffer=memory.buf, offset=slot * slot_bytes
+    )
+
+
+def worker_main(
+    conn,
+    model_path,
+    frames_name,
+    detections_name,
+    slots,
+    slot_bytes,
+    cpus,
+    warmup_runs,
+    imgsz,
+):
+    """
+    Entry point of an inference process. Frames are read from the shared
+    frame ring and detections written to the shared detections block, so
+    only shapes, options and counts travel through the pipe.
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        import torch
+
+        os.sched_setaffinity(0, cpus)
+        torch.set_num_threads(len(cpus))
+
+    from ultralytics import YOLO
+    from process.backends import warmup
+
+    frames = shared_memory.SharedMemory(name=frames_name)
+    detections_memory = shared_memory.SharedMemory(name=detections_name)
+    detections = np.ndarray(
+        (slots, MAX_DETECTIONS, DETECTION_COLUMNS),
+        dtype=np.float32,
+        buffer=detections_memory.buf,
+    )
+
+    model = YOLO(model_path, task="detect")
+    warmup(model, warmup_runs, imgsz)
+    conn.send(("ready", model.names))
+
+    while True:
+        try:
+            entries, predict = conn.recv()
+        except EOFError:
+            break
+
+        try:
+            images = [
+                (
+                    frame_view(frames, slot, slot_bytes, payload)
+                    if kind == "shm"
+                    else payload
+                )
+                for slot, (kind, payload) in enumerate(entries)
+            ]
+            counts = []
+            for slot, result in enumerate(model(images, **predict)):
+                data = result.boxes.cpu().numpy().data[:MAX_DETECTIONS]
+                detections[slot, : len(data)] = data
+                counts.append(len(data))
+            conn.send(("ok", counts))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class RemoteModel:
+    """
+    Stands in for a YOLO model inside an inference thread and forwards
+    each call to a dedicated worker process, sidestepping the GIL.
+    Frames larger than a ring slot are sent through the pipe instead.
+    """
+
+    def __init__(self, index, workers):
+        self.index = index
+        self.workers = workers
+        self.slots = settings.VISION_BATCH_MAX_SIZE
+        self.slot_bytes = settings.VISION_SHM_SLOT_BYTES
+        self.frames = shared_memory.SharedMemory(
+            create=True, size=self.slots * self.slot_bytes
+        )
+        self.detections_memory = shared_memory.SharedMemory(
+            create=True,
+            size=self.slots * MAX_DETECTIONS * DETECTION_COLUMNS * 4,
+        )
+        self.detections = np.ndarray(
+            (self.slots, MAX_DETECTIONS, DETECTION_COLUMNS),
+            dtype=np.float32,
+            buffer=self.detections_memory.buf,
+        )
+        self.lock = threading.Lock()
+        self.process = None
+        atexit.register(self.close)
+        self.start()
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        cpus = None
+        if settings.VISION_PROCESS_PINNING:
+            cpus = worker_cpus(self.index, self.workers)
+        self.process = context.Process(
+            target=worker_main,
+            args=(
+                child_conn,
+                model_path(),
+                self.frames.name,
+                self.detections_memory.name,
+                self.slots,
+                self.slot_bytes,
+                cpus,
+                settings.VISION_WARMUP_RUNS,
+                settings.VISION_IMGSZ,
+            ),
+            name=f"inference-process-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        # Drop our copy of the child's end so recv() fails if it dies.
+        child_conn.close()
+        try:
+            _, self.names = self.conn.recv()
+        except EOFError:
+            raise RuntimeError(f"Inference process {self.index} failed to start.")
+
+    def __call__(self, images, **predict):
+        with self.lock:
+            if not self.process.is_alive():
+                self.start()
+
+            entries = []
+            for slot, image in enumerate(images):
+                if slot < self.slots and image.nbytes <= self.slot_bytes:
+                    frame_view(self.frames, slot, self.slot_bytes, image.shape)[
+                        ...
+                    ] = image
+                    entries.append(("shm", image.shape))
+                else:
+                    entries.append(("inline", image))
+
+            try:
+                self.conn.send((entries, predict))
+                status, payload = self.conn.recv()
+            except (EOFError, OSError):
+                raise RuntimeError(f"Inference process {self.index} exited.")
+            if status == "error":
+                raise RuntimeError(f"Inference process {self.index} failed: {payload}")
+
+        # Boxes are views of the shared detections block, valid until the
+        # next call on this model, which is after this batch is rendered.
+        return [
+            Results(
+                orig_img=image,
+                path="",
+                names=self.names,
+                boxes=self.detections[slot, :count],
+            )
+            for slot, (image, count) in enumerate(zip(images, payload))
+        ]
+
+    def close(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+        for memory in (self.frames, self.detections_memory):
+            memory.close()
+            try:
+                memory.unlink()
+            except FileNotFoundError:
+                pass
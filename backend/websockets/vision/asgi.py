@@ -8,17 +8,27 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
 
 import os
-from django.urls import path
-from channels.routing import ProtocolTypeRouter, URLRouter
-from process.consumers import WebSocketConsumer
-from chat.consumers import ChatConsumer
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "vision.settings")
 
+# Set up Django before importing consumers so they can read settings.
+django_asgi_app = get_asgi_application()
+
+from django.urls import path, re_path
+from channels.routing import ProtocolTypeRouter, URLRouter
+from vision.metrics import MetricsConsumer
+from process.consumers import WebSocketConsumer
+from chat.consumers import ChatConsumer
+
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
+        "http": URLRouter(
+            [
+                path("metrics", MetricsConsumer.as_asgi()),
+                re_path(r"", django_asgi_app),
+            ]
+        ),
         "websocket": URLRouter(
             [
                 path("ws/vision/", WebSocketConsumer.as_asgi()),
@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import json
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -80,6 +82,108 @@ ASGI_APPLICATION = "vision.asgi.application"
 
 CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
 
+# Vision inference
+
+# Runtime used for inference: pytorch, torchscript, onnx or openvino.
+# Export models for the other runtimes with `manage.py export_vision_model`.
+VISION_BACKEND = os.getenv("VISION_BACKEND", "pytorch")
+VISION_SOURCE_MODEL = os.getenv("VISION_SOURCE_MODEL", "yolov8n.pt")
+# Defaults to the export of VISION_SOURCE_MODEL for VISION_BACKEND.
+VISION_MODEL_PATH = os.getenv("VISION_MODEL_PATH")
+VISION_WARMUP_RUNS = int(os.getenv("VISION_WARMUP_RUNS", "2"))
+VISION_STARTUP_BENCHMARK = os.getenv("VISION_STARTUP_BENCHMARK", "False").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+VISION_IMGSZ = int(os.getenv("VISION_IMGSZ", "640"))
+VISION_MAX_IMGSZ = int(os.getenv("VISION_MAX_IMGSZ", "1280"))
+
+VISION_OUTPUT_CODEC = os.getenv("VISION_OUTPUT_CODEC", "jpeg")
+VISION_OUTPUT_QUALITY = int(os.getenv("VISION_OUTPUT_QUALITY", "80"))
+
+VISION_INFERENCE_WORKERS = int(os.getenv("VISION_INFERENCE_WORKERS", "2"))
+VISION_INFERENCE_QUEUE_SIZE = int(os.getenv("VISION_INFERENCE_QUEUE_SIZE", "4"))
+
+# "thread" runs the model inside each inference thread, "process" gives each
+# thread its own worker process fed through shared memory.
+VISION_WORKER_MODE = os.getenv("VISION_WORKER_MODE", "thread")
+VISION_PROCESS_PINNING = os.getenv("VISION_PROCESS_PINNING", "False").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+VISION_SHM_SLOT_BYTES = int(os.getenv("VISION_SHM_SLOT_BYTES", str(1920 * 1080 * 3)))
+
+VISION_MOTION_THRESHOLD = float(os.getenv("VISION_MOTION_THRESHOLD", "0.02"))
+VISION_KEYFRAME_INTERVAL = int(os.getenv("VISION_KEYFRAME_INTERVAL", "30"))
+
+# Stock sync from camera counts. VISION_STOCK_LABELS maps detected labels to
+# product slugs, e.g. {"bottle": "milk-bottles"}; clients may override it.
+INVENTORY_API_URL = os.getenv(
+    "INVENTORY_API_URL", "http://localhost:8000/api/v1/inventory/"
+)
+INVENTORY_API_TIMEOUT = float(os.getenv("INVENTORY_API_TIMEOUT", "5"))
+VISION_STOCK_LABELS = json.loads(os.getenv("VISION_STOCK_LABELS", "{}"))
+VISION_STOCK_WINDOW = float(os.getenv("VISION_STOCK_WINDOW", "5"))
+VISION_STOCK_DEBOUNCE = float(os.getenv("VISION_STOCK_DEBOUNCE", "3"))
+VISION_STOCK_FLUSH_INTERVAL = float(os.getenv("VISION_STOCK_FLUSH_INTERVAL", "10"))
+
+VISION_BATCH_MAX_SIZE = int(os.getenv("VISION_BATCH_MAX_SIZE", "8"))
+VISION_BATCH_MAX_WAIT_MS = float(os.getenv("VISION_BATCH_MAX_WAIT_MS", "10"))
+
+# Chat assistant
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# "gemini", or "stub" for canned offline replies in load tests.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "200"))
+LLM_STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", "0"))
+LLM_STUB_CHUNKS = int(os.getenv("LLM_STUB_CHUNKS", "4"))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "0"))
+
+# Process-wide cap on in-flight LLM calls and on callers queued for one;
+# callers beyond the queue, or waiting past the timeout, get a busy reply.
+CHAT_MAX_CONCURRENT_CALLS = int(os.getenv("CHAT_MAX_CONCURRENT_CALLS", "16"))
+CHAT_MAX_WAITING_CALLS = int(os.getenv("CHAT_MAX_WAITING_CALLS", "64"))
+CHAT_CALL_WAIT_TIMEOUT = float(os.getenv("CHAT_CALL_WAIT_TIMEOUT", "10"))
+# Messages a single socket may have queued behind the one being answered.
+CHAT_SOCKET_QUEUE_SIZE = int(os.getenv("CHAT_SOCKET_QUEUE_SIZE", "4"))
+
+# Chat sessions kept in memory; the least recently active idle ones beyond
+# this are offloaded to CHAT_SESSION_DB. Clients that connect with
+# ?session=<id> can resume their session for CHAT_SESSION_TTL seconds.
+CHAT_MAX_RESIDENT_SESSIONS = int(os.getenv("CHAT_MAX_RESIDENT_SESSIONS", "1000"))
+CHAT_SESSION_DB = os.getenv("CHAT_SESSION_DB", str(BASE_DIR / "chat_sessions.sqlite3"))
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", str(24 * 60 * 60)))
+
+# Send partial reply frames while Gemini generates; clients can also pass
+# ?stream=1 or ?stream=0 on ws/chat/.
+CHAT_STREAMING = os.getenv("CHAT_STREAMING", "False").lower() in ("true", "1", "yes")
+
+# Chat history is cut back to the newest turns once it exceeds either limit,
+# with older turns folded into a summary (or dropped if summarizing is off).
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "8"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+CHAT_HISTORY_SUMMARIZE = os.getenv("CHAT_HISTORY_SUMMARIZE", "True").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+
+# Answer greetings and out-of-scope requests locally when the intent
+# classifier's confidence reaches the threshold.
+CHAT_LOCAL_INTENTS = os.getenv("CHAT_LOCAL_INTENTS", "True").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+CHAT_INTENT_THRESHOLD = float(os.getenv("CHAT_INTENT_THRESHOLD", "0.65"))
+
+# Cached replies for repeated context-free questions; size 0 disables it.
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "256"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 